@@ -0,0 +1,159 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from clock import get_clock
+from instrument_utils import OPC_TIMEOUT_MS, initialize_instruments, is_settled
+from scpi_simulator import create_simulated_instruments
+from scpi_session import (
+    MAX_MESSAGE_LENGTH,
+    BatchError,
+    group_commands,
+    join_commands,
+    parse_values,
+)
+
+
+class AsyncInstrument:
+    """asyncio adapter over a blocking RsInstrument/pyvisa session
+
+    Every call runs on a dedicated single-thread executor, so I/O to one
+    instrument stays ordered while the event loop keeps serving other
+    instruments and tasks.
+    """
+
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def _call(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, method, *args)
+
+    async def write_str(self, command):
+        await self._call(self.instrument.write_str, command)
+
+    async def write(self, command):
+        await self._call(self.instrument.write, command)
+
+    async def query_str(self, query):
+        return await self._call(self.instrument.query_str, query)
+
+    async def query_float(self, query):
+        return await self._call(self.instrument.query_float, query)
+
+    async def query_opc(self, timeout=0):
+        return await self._call(self.instrument.query_opc, timeout)
+
+    async def close(self):
+        await self._call(self.instrument.close)
+        self._executor.shutdown(wait=False)
+
+
+class AsyncMockInstrument:
+    """asyncio version of a simulated instrument
+
+    Latencies and *OPC? waits are awaited on the bench clock, so a
+    VirtualClock runs the async path as fast as the blocking one.
+    """
+
+    def __init__(self, mock):
+        self.mock = mock
+        mock.sleep = lambda seconds: None
+
+    def __getattr__(self, attribute):
+        return getattr(self.mock, attribute)
+
+    @property
+    def clock(self):
+        return self.mock.bench.clock
+
+    async def write_str(self, command):
+        await self.clock.sleep_async(self.mock.latency(command))
+        self.mock.write_str(command)
+
+    async def write(self, command):
+        await self.write_str(command)
+
+    async def query_str(self, query):
+        if "*OPC?" in query:
+            return str(await self.query_opc())
+        await self.clock.sleep_async(self.mock.latency(query))
+        return self.mock.query_str(query)
+
+    async def query_float(self, query):
+        return float(await self.query_str(query))
+
+    async def query_opc(self, timeout=0):
+        remaining = self.mock.busy_until - self.clock.monotonic()
+        if timeout and remaining > timeout / 1000:
+            await self.clock.sleep_async(timeout / 1000)
+            raise TimeoutError(f"*OPC? timed out after {timeout} ms")
+        await self.clock.sleep_async(remaining)
+        return 1
+
+    async def close(self):
+        self.mock.close()
+
+
+async def initialize_instruments_async(config, use_mock=True):
+    """Async counterpart of initialize_instruments"""
+    if use_mock:
+        print("Initializing async mock instruments...")
+        FSMR_STD, SigGen_UUC = create_simulated_instruments()
+        return AsyncMockInstrument(FSMR_STD), AsyncMockInstrument(SigGen_UUC)
+
+    FSMR_STD, SigGen_UUC = await asyncio.to_thread(
+        initialize_instruments, config, False
+    )
+    if not FSMR_STD or not SigGen_UUC:
+        return None, None
+    return AsyncInstrument(FSMR_STD), AsyncInstrument(SigGen_UUC)
+
+
+async def reset_instruments(FSMR_STD, SigGen_UUC):
+    """Reset both instruments to default state"""
+    await asyncio.gather(FSMR_STD.write_str("*RST"), SigGen_UUC.write_str("*RST"))
+
+
+async def wait_for_opc(instrument, fallback_delay, timeout=None):
+    """Await pending operations (*OPC?), else sleep fallback_delay seconds"""
+    try:
+        await instrument.query_opc(OPC_TIMEOUT_MS if timeout is None else timeout)
+    except Exception as e:
+        print(f"*OPC? synchronization failed ({e}), waiting {fallback_delay} s instead")
+        await get_clock().sleep_async(fallback_delay)
+
+
+async def write_batch(instrument, commands, max_length=MAX_MESSAGE_LENGTH):
+    """Async counterpart of scpi_session.batch: send commands as compound messages"""
+    offset = 0
+    for group in group_commands(commands, max_length):
+        try:
+            await instrument.write_str(join_commands(group))
+        except Exception as e:
+            raise BatchError.locate(group, e, offset) from e
+        offset += len(group)
+
+
+async def query_values(instrument, queries, types=None):
+    """Async counterpart of scpi_session.query_values"""
+    response = await instrument.query_str(join_commands(queries))
+    return parse_values(response, len(queries), types)
+
+
+async def read_settled(
+    instrument, queries, max_delay, tolerance, interval=0.05, samples=3
+):
+    """Async counterpart of instrument_utils.read_settled"""
+    clock = get_clock()
+    start = clock.monotonic()
+    history = []
+    while True:
+        await clock.sleep_async(min(interval, max_delay - (clock.monotonic() - start)))
+        values = await query_values(instrument, queries)
+        elapsed = clock.monotonic() - start
+        history = (history + [values])[-samples:]
+        if len(history) == samples and is_settled(history, tolerance):
+            return values, elapsed
+        if elapsed >= max_delay:
+            return values, elapsed
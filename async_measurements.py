@@ -0,0 +1,285 @@
+"""asyncio variant of the measurement API
+
+Runs the same measurement definitions as the blocking path (AM_MEASUREMENT,
+FM_MEASUREMENT, LEVEL_MEASUREMENT and POWER_METER_SETUP, see
+measurement_plan), but every instrument call and delay is awaited so one
+event loop can drive several stations plus MQTT, notification and
+monitoring tasks concurrently. Setup stages go out as compound messages,
+delays follow the default clock (see clock.get_clock) and results are the
+records of results.py. Instruments come from
+async_instruments.initialize_instruments_async().
+"""
+import asyncio
+import json
+
+from am_modulation import AM_MEASUREMENT
+from async_instruments import (
+    query_values,
+    read_settled,
+    reset_instruments,
+    wait_for_opc,
+    write_batch,
+)
+from clock import get_clock
+from fm_modulation import FM_MEASUREMENT
+from level_measurement import LEVEL_MEASUREMENT, POWER_METER_SETUP
+from measurement_plan import compile_setup, make_result, record_setting
+from scheduler import MEASUREMENTS
+
+
+async def run_setup(FSMR_STD, SigGen_UUC, stages):
+    """Async counterpart of measurement_plan.run_setup"""
+    sessions = {"fsmr": FSMR_STD, "siggen": SigGen_UUC}
+    for instrument, commands, opc_wait in stages:
+        await write_batch(sessions[instrument], commands)
+        if opc_wait is not None:
+            await wait_for_opc(sessions[instrument], opc_wait)
+
+
+async def perform_measurements(
+    measurement,
+    FSMR_STD,
+    SigGen_UUC,
+    freq_display,
+    freq_value,
+    points,
+    mqtt_client,
+    adaptive=False,
+    settings=None,
+):
+    """Async counterpart of measurement_plan.perform_measurements"""
+    results = []
+    sessions = {"fsmr": FSMR_STD, "siggen": SigGen_UUC}
+    instrument, template = measurement["point"]
+    point_key = measurement["point_key"]
+    queries = measurement["queries"]
+    clock = get_clock()
+
+    for point in points:
+        command = template.format(**point)
+        await sessions[instrument].write_str(command)
+        if settings is not None:
+            record_setting(settings, instrument, command)
+
+        if adaptive:
+            values, settle_time = await read_settled(
+                FSMR_STD,
+                queries,
+                point["delay"],
+                point.get("tolerance", measurement["tolerance"]),
+            )
+            print(
+                f"{measurement['label']} {point[point_key]}: settled in "
+                f"{settle_time:.2f} s, saved {2 * point['delay'] - settle_time:.2f} s"
+            )
+        else:
+            await clock.sleep_async(point["delay"])
+            values = await query_values(FSMR_STD, queries)
+
+        result = make_result(measurement, freq_display, freq_value, point, values)
+        results.append(result)
+
+        if mqtt_client:
+            mqtt_client.publish(
+                measurement["topic"], json.dumps(result.to_dict()), qos=1
+            )
+
+        if not adaptive:
+            await clock.sleep_async(point["delay"])
+
+    return results
+
+
+async def setup_am_modulation(FSMR_STD, SigGen_UUC, freq_display, freq_value):
+    """Setup FSMR for AM modulation measurements"""
+    await run_setup(
+        FSMR_STD, SigGen_UUC, compile_setup(AM_MEASUREMENT, freq_display, freq_value)
+    )
+
+
+async def setup_fm_modulation(FSMR_STD, SigGen_UUC, freq_display, freq_value):
+    """Setup FSMR for FM modulation measurements"""
+    await run_setup(
+        FSMR_STD, SigGen_UUC, compile_setup(FM_MEASUREMENT, freq_display, freq_value)
+    )
+
+
+async def setup_power_meter(FSMR_STD, settings=None):
+    """Enable and zero the power meter attached to the FSMR"""
+    await run_setup(
+        FSMR_STD, None, compile_setup({"setup": POWER_METER_SETUP}, None, None, settings)
+    )
+
+
+async def setup_level_measurement(
+    FSMR_STD, SigGen_UUC, freq_display, freq_value, zero_power_meter=True
+):
+    """Setup FSMR for level measurements"""
+    settings = {}
+    if zero_power_meter:
+        await setup_power_meter(FSMR_STD, settings)
+    await run_setup(
+        FSMR_STD,
+        SigGen_UUC,
+        compile_setup(LEVEL_MEASUREMENT, freq_display, freq_value, settings),
+    )
+
+
+async def perform_am_measurements(
+    FSMR_STD,
+    SigGen_UUC,
+    freq_display,
+    freq_value,
+    mod_depths,
+    mqtt_client,
+    adaptive=False,
+):
+    """Perform AM modulation measurements for a frequency point"""
+    return await perform_measurements(
+        AM_MEASUREMENT,
+        FSMR_STD,
+        SigGen_UUC,
+        freq_display,
+        freq_value,
+        mod_depths,
+        mqtt_client,
+        adaptive=adaptive,
+    )
+
+
+async def perform_fm_measurements(
+    FSMR_STD,
+    SigGen_UUC,
+    freq_display,
+    freq_value,
+    DEViation,
+    mqtt_client,
+    adaptive=False,
+):
+    """Perform FM modulation measurements for a frequency point"""
+    return await perform_measurements(
+        FM_MEASUREMENT,
+        FSMR_STD,
+        SigGen_UUC,
+        freq_display,
+        freq_value,
+        DEViation,
+        mqtt_client,
+        adaptive=adaptive,
+    )
+
+
+async def perform_level_measurements(
+    FSMR_STD,
+    SigGen_UUC,
+    freq_display,
+    freq_value,
+    level_points,
+    mqtt_client,
+    adaptive=False,
+):
+    """Perform level measurements for a frequency point"""
+    return await perform_measurements(
+        LEVEL_MEASUREMENT,
+        FSMR_STD,
+        SigGen_UUC,
+        freq_display,
+        freq_value,
+        level_points,
+        mqtt_client,
+        adaptive=adaptive,
+    )
+
+
+async def execute_plan(
+    plan,
+    FSMR_STD,
+    SigGen_UUC,
+    mqtt_client,
+    notification_manager,
+    on_results,
+    adaptive=False,
+):
+    """Async counterpart of scheduler.execute_plan
+
+    Runs every plan order build_execution_plan() makes, compiling each
+    setup against the settings earlier steps left behind. There is no
+    trace mode.
+    """
+    settings = {}
+    for step in plan:
+        action = step["action"]
+        freq = step.get("freq")
+
+        try:
+            if action == "reset":
+                settings.clear()
+                await reset_instruments(FSMR_STD, SigGen_UUC)
+
+            elif action == "zero_power_meter":
+                await setup_power_meter(FSMR_STD, settings)
+
+            elif action in MEASUREMENTS:
+                measurement = MEASUREMENTS[action]
+                if step.get("zero_power_meter"):
+                    await setup_power_meter(FSMR_STD, settings)
+                await run_setup(
+                    FSMR_STD,
+                    SigGen_UUC,
+                    compile_setup(
+                        measurement, freq["display"], freq["value"], settings
+                    ),
+                )
+                results = await perform_measurements(
+                    measurement,
+                    FSMR_STD,
+                    SigGen_UUC,
+                    freq["display"],
+                    freq["value"],
+                    step["points"],
+                    mqtt_client,
+                    adaptive=adaptive,
+                    settings=settings,
+                )
+                on_results(action, freq, results)
+
+            else:
+                raise ValueError(f"Unknown plan action: {action}")
+
+        except Exception as e:
+            settings.clear()
+            if freq:
+                error_msg = f"Error processing frequency {freq['display']}: {str(e)}"
+            else:
+                error_msg = f"Error during {action} step: {str(e)}"
+            # log_error waits for the manager's lock, which other threads
+            # share, and fsyncs the run journal; keep both off the event loop
+            await asyncio.to_thread(notification_manager.log_error, error_msg)
+
+
+async def run_stations(stations, notification_manager, side_tasks=()):
+    """Drive several instrument pairs and side tasks on one event loop
+
+    stations is a list of (FSMR_STD, SigGen_UUC, plan, mqtt_client,
+    on_results) tuples. Side tasks (coroutines such as monitors or
+    heartbeats) run until every station has finished and are then cancelled.
+    """
+    background = [asyncio.ensure_future(task) for task in side_tasks]
+    try:
+        await asyncio.gather(
+            *(
+                execute_plan(
+                    plan,
+                    FSMR_STD,
+                    SigGen_UUC,
+                    mqtt_client,
+                    notification_manager,
+                    on_results,
+                )
+                for FSMR_STD, SigGen_UUC, plan, mqtt_client, on_results in stations
+            )
+        )
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
@@ -0,0 +1,756 @@
+"""Benchmarks for the calibration code paths, run against the mock instruments
+
+    python benchmark.py stations --stations 1 2 4 --freqs 8
+    python benchmark.py startup --budget-ms 150
+    python benchmark.py datalogger --rows 20000
+    python benchmark.py transfer --points 10000 100000 1000000
+    python benchmark.py virtual --freqs 60 --points 5
+    python benchmark.py sweep --virtual --output sweep.json --baseline baseline.json
+    python benchmark.py instrumentation --freqs 20 --trace trace.json
+    python benchmark.py records --points 100000
+"""
+import argparse
+from collections import defaultdict
+from contextlib import contextmanager
+import csv
+import json
+import os
+import tempfile
+import subprocess
+import sys
+from time import perf_counter
+
+# Modules the mock/dry-run path imports
+MOCK_PATH_MODULES = [
+    "instrument_utils",
+    "am_modulation",
+    "fm_modulation",
+    "level_measurement",
+    "notification_manager",
+    "mqtt_publisher",
+    "scheduler",
+    "station_runner",
+]
+# Dependencies that only the real-instrument, MQTT and SMS paths may load
+HEAVY_MODULES = ["pyvisa", "RsInstrument", "paho", "pandas", "twilio"]
+
+
+def make_freq_points(count, start_mhz=100, step_mhz=100):
+    """Synthetic FREQ_POINTS entries"""
+    return [
+        {
+            "display": f"{start_mhz + index * step_mhz} MHz",
+            "value": f"{start_mhz + index * step_mhz}e6",
+        }
+        for index in range(count)
+    ]
+
+
+def make_mod_depths(count, delay=0.05):
+    """Synthetic MOD_DEPTHS entries"""
+    return [
+        {"depth": f"{10 + index * 80 // max(count - 1, 1)}PCT", "delay": delay}
+        for index in range(count)
+    ]
+
+
+def make_mod_devs(count, delay=0.05):
+    """Synthetic MOD_DEV entries"""
+    return [{"dev": f"{(index + 1) * 5}e3", "delay": delay} for index in range(count)]
+
+
+def make_level_points(count, delay=0.05):
+    """Synthetic LEVEL_POINTS entries"""
+    return [{"level": str(-10 * index), "delay": delay} for index in range(count)]
+
+
+def bench_stations(args):
+    """Wall time of one sweep split over 1..N mock stations"""
+    from notification_manager import NotificationManager
+    from station_runner import run_stations
+
+    freq_points = make_freq_points(args.freqs)
+    mod_depths = make_mod_depths(args.points, args.delay)
+    level_points = make_level_points(args.points, args.delay)
+
+    baseline = None
+    for n_stations in args.stations:
+        config = {
+            "stations": [
+                {"fsmr_address": f"MOCK::{index}", "siggen_address": f"MOCK::{index}"}
+                for index in range(n_stations)
+            ]
+        }
+        notification_manager = NotificationManager({}, {})
+
+        start = perf_counter()
+        results = run_stations(
+            config,
+            freq_points,
+            mod_depths,
+            level_points,
+            None,
+            notification_manager,
+            use_mock=True,
+        )
+        elapsed = perf_counter() - start
+
+        baseline = baseline or elapsed
+        n_results = sum(map(len, results.values()))
+        print(
+            f"{n_stations} station(s): {elapsed:7.2f} s, {n_results} results, "
+            f"speedup x{baseline / elapsed:.2f}"
+        )
+
+
+def bench_startup(args):
+    """Import time of the mock path (python -X importtime), checked against a budget"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(args.modules)}"],
+        capture_output=True,
+        text=True,
+        # The modules are imported from the repository, wherever this runs from
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if completed.returncode != 0:
+        print(completed.stderr)
+        sys.exit(completed.returncode)
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imports.append((int(cumulative), name.rstrip()))
+
+    # Interpreter startup modules (site, encodings, ...) are not counted
+    top_level = [
+        (us, name.strip())
+        for us, name in imports
+        if not name.startswith("  ") and name.strip() in args.modules
+    ]
+    total_ms = sum(us for us, _ in top_level) / 1000
+    packages = {name.strip().split(".")[0] for _, name in imports}
+    heavy = sorted(packages.intersection(HEAVY_MODULES))
+
+    print(f"Mock path import time: {total_ms:.1f} ms (budget {args.budget_ms} ms)")
+    for us, name in sorted(top_level, reverse=True)[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    if heavy:
+        print(f"Heavy dependencies imported at startup: {', '.join(heavy)}")
+
+    if total_ms > args.budget_ms or heavy:
+        sys.exit(1)
+
+
+def _legacy_write_csv(filename, data):
+    # DataLogger._write_csv before persistent handles: open per row
+    is_new_file = not os.path.exists(filename)
+    mode = "w" if is_new_file else "a"
+
+    with open(filename, mode, newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=data.keys())
+        if is_new_file:
+            writer.writeheader()
+        writer.writerow(data)
+
+
+def bench_datalogger(args):
+    """Rows per second of DataLogger against the old open-per-row CSV writes"""
+    from utils.data_logger import DataLogger
+
+    row = {
+        "type": "level_measurement",
+        "frequency": "100 MHz",
+        "level": "-10",
+        "measured": -10.012,
+        "uncertainty": 0.0123,
+        "timestamp": "12:00:00",
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = perf_counter()
+        for _ in range(args.rows):
+            _legacy_write_csv(f"{directory}/legacy.csv", row)
+        legacy = args.rows / (perf_counter() - start)
+
+        start = perf_counter()
+        with DataLogger(directory, batch_size=args.batch_size) as logger:
+            for _ in range(args.rows):
+                logger.log_level_measurement(row)
+        buffered = args.rows / (perf_counter() - start)
+
+    print(f"open per row:      {legacy:12,.0f} rows/s")
+    print(f"persistent handle: {buffered:12,.0f} rows/s (x{buffered / legacy:.1f})")
+
+
+def bench_transfer(args):
+    """ASCII vs REAL,32 binary block trace transfer: bytes on the bus and parse time"""
+    import numpy as np
+
+    from binary_block import block_dtype, parse_block
+
+    for points in args.points:
+        trace = np.random.normal(0, 30, points).astype(np.float32)
+
+        # What the instrument sends in FORM ASC and in FORM REAL,32 + BORD SWAP
+        ascii_payload = ",".join(f"{value:.7g}" for value in trace).encode()
+        binary_payload = trace.astype(block_dtype("SWAP")).tobytes()
+        length = str(len(binary_payload))
+        binary_block = f"#{len(length)}{length}".encode() + binary_payload
+
+        start = perf_counter()
+        for _ in range(args.repeat):
+            ascii_values = np.array(ascii_payload.decode().split(","), dtype=np.float64)
+        ascii_parse = (perf_counter() - start) / args.repeat
+
+        start = perf_counter()
+        for _ in range(args.repeat):
+            binary_values = parse_block(binary_block)
+        binary_parse = (perf_counter() - start) / args.repeat
+
+        assert np.allclose(ascii_values, binary_values, rtol=1e-6)
+        link = args.link_mbit * 1e6 / 8
+        ascii_total = ascii_parse + len(ascii_payload) / link
+        binary_total = binary_parse + len(binary_block) / link
+        print(
+            f"{points:>9,} points: ASCII {len(ascii_payload) / 1e6:7.2f} MB, "
+            f"parse {ascii_parse * 1e3:8.2f} ms | binary "
+            f"{len(binary_block) / 1e6:6.2f} MB, parse {binary_parse * 1e3:6.3f} ms | "
+            f"with {args.link_mbit:g} Mbit/s link x{ascii_total / binary_total:.1f}"
+        )
+
+
+def bench_virtual(args):
+    """Full plan against the simulator on a virtual clock: predicted vs actual time"""
+    from clock import VirtualClock, use_clock
+    from instrument_utils import initialize_instruments
+    from notification_manager import NotificationManager
+    from scheduler import build_execution_plan, execute_plan
+
+    freq_points = make_freq_points(args.freqs)
+    mod_depths = make_mod_depths(args.points, args.delay)
+    level_points = make_level_points(args.points, args.delay)
+
+    with use_clock(VirtualClock()) as clock:
+        notification_manager = NotificationManager({}, {})
+        FSMR_STD, SigGen_UUC = initialize_instruments({}, use_mock=True)
+        results = []
+
+        start = perf_counter()
+        execute_plan(
+            build_execution_plan(freq_points, mod_depths, level_points),
+            FSMR_STD,
+            SigGen_UUC,
+            None,
+            notification_manager,
+            lambda measurement_type, freq, step_results: results.extend(step_results),
+            adaptive=args.adaptive,
+            trace=args.traces,
+        )
+        elapsed = perf_counter() - start
+
+    print(
+        f"{len(results)} results: predicted wall time {clock.elapsed / 60:.1f} min, "
+        f"simulated in {elapsed:.2f} s"
+    )
+
+
+def bench_instrumentation(args):
+    """Cost of the SCPI/phase instrumentation: off, histograms only, full trace"""
+    from clock import VirtualClock, use_clock
+    from instrument_utils import initialize_instruments
+    from instrumentation import (
+        disable_instrumentation,
+        enable_instrumentation,
+        instrument_session,
+    )
+    from notification_manager import NotificationManager
+    from scheduler import build_execution_plan, execute_plan
+
+    plan = build_execution_plan(
+        make_freq_points(args.freqs),
+        make_mod_depths(args.points, args.delay),
+        make_level_points(args.points, args.delay),
+    )
+
+    def run(mode):
+        if mode != "off":
+            enable_instrumentation(record_calls=mode == "trace")
+        with use_clock(VirtualClock()):
+            FSMR_STD, SigGen_UUC = initialize_instruments({}, use_mock=True)
+            start = perf_counter()
+            execute_plan(
+                plan,
+                instrument_session(FSMR_STD, "FSMR"),
+                instrument_session(SigGen_UUC, "SigGen"),
+                None,
+                NotificationManager({}, {}),
+                lambda measurement_type, freq, results: None,
+            )
+            elapsed = perf_counter() - start
+        return elapsed, disable_instrumentation()
+
+    _, instrumentation = run("trace")
+    calls = sum(h.count for h in instrumentation.histograms.values())
+    print(f"{calls} SCPI calls, {len(instrumentation.events) - calls} spans per run")
+
+    baseline = None
+    for mode in ("off", "histograms", "trace"):
+        elapsed = min(run(mode)[0] for _ in range(args.repeat))
+        baseline = baseline or elapsed
+        print(
+            f"{mode:>10}: {elapsed * 1e3:8.1f} ms, "
+            f"{(elapsed - baseline) / calls * 1e6:5.1f} us per call over off"
+        )
+    if args.trace:
+        instrumentation.export_chrome_trace(args.trace)
+        print(f"Trace written to {args.trace}")
+
+
+def bench_records(args):
+    """AM results as records vs dicts: memory per point, JSON and array conversion"""
+    import tracemalloc
+
+    import numpy as np
+
+    from clock import get_clock
+    from results import AmResult, timestamps, to_array
+
+    clock = get_clock()
+    freq_points = make_freq_points(max(args.points // 100, 1))
+    mod_depths = make_mod_depths(100)
+
+    def points():
+        for index in range(args.points):
+            freq = freq_points[index // 100 % len(freq_points)]
+            yield freq, mod_depths[index % 100]["depth"], 30 + index % 1000 * 1e-3
+
+    # What perform_am_measurements returned before and returns now
+    def make_dicts():
+        return [
+            {
+                "type": "am_modulation",
+                "frequency": freq["display"],
+                "modDepth": depth,
+                "amValue": round(value, 3),
+                "distortion": round(value / 100, 3),
+                "timestamp": clock.now().strftime("%H:%M:%S"),
+            }
+            for freq, depth, value in points()
+        ]
+
+    def make_records():
+        return [
+            AmResult(
+                freq["display"],
+                float(freq["value"]),
+                depth,
+                round(value, 3),
+                round(value / 100, 3),
+                *timestamps(clock),
+            )
+            for freq, depth, value in points()
+        ]
+
+    keys = [key for key, _ in AmResult.KEYS]
+    dict_dtype = np.dtype([(key, "U16" if key == "modDepth" else "f8") for key in keys])
+
+    def dicts_to_array(results):
+        rows = [tuple(row[key] for key in keys) for row in results]
+        return np.array(rows, dtype=dict_dtype)
+
+    formats = [
+        ("dict", make_dicts, lambda result: result, dicts_to_array),
+        ("record", make_records, AmResult.to_dict, to_array),
+    ]
+    for name, make, to_dict, as_array in formats:
+        tracemalloc.start()
+        results = make()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        timings = {}
+        for label, run in (
+            ("create", make),
+            ("json", lambda: [json.dumps(to_dict(result)) for result in results]),
+            ("array", lambda: as_array(results)),
+        ):
+            start = perf_counter()
+            run()
+            timings[label] = (perf_counter() - start) / args.points * 1e6
+
+        array = as_array(results)
+        column = "amValue" if name == "dict" else "am_value"
+        start = perf_counter()
+        mean = float(np.mean(array[column]))
+        stats_time = (perf_counter() - start) * 1e3
+        print(
+            f"{name:>6}: {memory / args.points:6.0f} B/point | create "
+            f"{timings['create']:5.2f} us, JSON {timings['json']:5.2f} us, "
+            f"to array {timings['array']:5.2f} us per point | mean {mean:.3f} "
+            f"in {stats_time:.2f} ms"
+        )
+
+
+# Phases of a sweep; time outside all of them is reported as "other"
+SWEEP_PHASES = [
+    "setup_wait",
+    "dwell",
+    "scpi_io",
+    "mqtt",
+    "file_writes",
+    "notifications",
+    "other",
+]
+
+
+class PhaseTimer:
+    """Exclusive time per phase: time in a nested phase is not counted in its parent"""
+
+    def __init__(self, now):
+        self.now = now
+        self.totals = defaultdict(float)
+        self.stack = ["other"]
+        self.mark = now()
+
+    @contextmanager
+    def phase(self, name):
+        self._switch()
+        self.stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch()
+            self.stack.pop()
+
+    def _switch(self):
+        now = self.now()
+        self.totals[self.stack[-1]] += now - self.mark
+        self.mark = now
+
+    def finish(self):
+        self._switch()
+        return {phase: self.totals[phase] for phase in SWEEP_PHASES}
+
+
+class _TimedClock:
+    """Clock whose sleeps (point delays, settling polls) count as dwell"""
+
+    def __init__(self, clock, timer):
+        self.clock = clock
+        self.timer = timer
+
+    def monotonic(self):
+        return self.clock.monotonic()
+
+    def now(self):
+        return self.clock.now()
+
+    def sleep(self, seconds):
+        with self.timer.phase("dwell"):
+            self.clock.sleep(seconds)
+
+
+class _TimedInstrument:
+    """Instrument proxy: *OPC? waits count as setup_wait, everything else as SCPI I/O"""
+
+    def __init__(self, instrument, timer):
+        self.instrument = instrument
+        self.timer = timer
+
+    def __getattr__(self, attribute):
+        method = getattr(self.instrument, attribute)
+        phase = "setup_wait" if attribute == "query_opc" else "scpi_io"
+
+        def timed(*args, **kwargs):
+            with self.timer.phase(phase):
+                return method(*args, **kwargs)
+
+        return timed
+
+
+class _TimedPublisher:
+    def __init__(self, publisher, timer):
+        self.publisher = publisher
+        self.timer = timer
+
+    def publish(self, topic, payload, qos=1):
+        with self.timer.phase("mqtt"):
+            self.publisher.publish(topic, payload, qos)
+
+
+class _LoopbackMqttClient:
+    """Stands in for a connected paho client; every message is acknowledged"""
+
+    class _Info:
+        rc = 0
+
+        def __init__(self, mid):
+            self.mid = mid
+
+        def is_published(self):
+            return True
+
+    def __init__(self):
+        self.mid = 0
+
+    def is_connected(self):
+        return True
+
+    def publish(self, topic, payload, qos=1):
+        self.mid += 1
+        return self._Info(self.mid)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+def run_sweep(args):
+    """One run_calibration-equivalent sweep; returns the machine-readable result"""
+    from clock import RealClock, VirtualClock, use_clock
+    from mqtt_publisher import BufferedPublisher
+    from notification_manager import NotificationManager
+    from result_sink import ResultSink
+    from run_journal import RunJournal
+    from scheduler import build_execution_plan, execute_plan
+    from scpi_session import StateCachingSession
+    from scpi_simulator import create_simulated_instruments
+
+    base_clock = VirtualClock() if args.virtual else RealClock()
+    if args.virtual:
+        timer = PhaseTimer(lambda: perf_counter() + base_clock.elapsed)
+    else:
+        timer = PhaseTimer(perf_counter)
+
+    freq_points = make_freq_points(args.freqs)
+    mod_depths = make_mod_depths(args.depths, args.delay)
+    level_points = make_level_points(args.levels, args.delay)
+    mod_devs = make_mod_devs(args.devs, args.delay)
+    n_results = 0
+
+    with tempfile.TemporaryDirectory() as directory, use_clock(
+        _TimedClock(base_clock, timer)
+    ):
+        FSMR_STD, SigGen_UUC = create_simulated_instruments(
+            settle_tau=args.settle_tau,
+            clock=base_clock,
+            command_latency=args.command_latency,
+            transfer_rate=args.transfer_rate,
+        )
+        FSMR_STD = StateCachingSession(_TimedInstrument(FSMR_STD, timer), "FSMR")
+        SigGen_UUC = StateCachingSession(_TimedInstrument(SigGen_UUC, timer), "SigGen")
+        publisher = BufferedPublisher(
+            _LoopbackMqttClient(), spill_path=f"{directory}/spill.jsonl"
+        )
+        notification_manager = NotificationManager({}, {})
+        journal = RunJournal(f"{directory}/journal.jsonl")
+
+        with ResultSink(f"{directory}/", formats=args.formats, durable=True) as sink:
+
+            def write_results(measurement_type, freq, results):
+                nonlocal n_results
+                n_results += len(results)
+                with timer.phase("notifications"):
+                    for result in results:
+                        notification_manager.log_measurement(result, measurement_type)
+                with timer.phase("file_writes"):
+                    sink.write(measurement_type, results)
+                    sink.commit()
+                    journal.record_results(measurement_type, freq, results)
+
+            plan = build_execution_plan(
+                freq_points,
+                mod_depths,
+                level_points,
+                order=args.plan_order,
+                mod_devs=mod_devs,
+            )
+            execute_plan(
+                plan,
+                FSMR_STD,
+                SigGen_UUC,
+                _TimedPublisher(publisher, timer),
+                notification_manager,
+                write_results,
+                adaptive=args.adaptive,
+                trace=args.traces,
+            )
+
+            with timer.phase("file_writes"):
+                sink.commit()
+                journal.close()
+            with timer.phase("notifications"):
+                notification_manager.generate_summary_report()
+        with timer.phase("mqtt"):
+            publisher.close()
+        phases = timer.finish()
+
+    wall_time = sum(phases.values())
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "freqs",
+                "depths",
+                "devs",
+                "levels",
+                "delay",
+                "command_latency",
+                "transfer_rate",
+                "settle_tau",
+                "virtual",
+                "adaptive",
+                "traces",
+                "plan_order",
+                "formats",
+            )
+        },
+        "points": n_results,
+        "wall_time": wall_time,
+        "time_per_point": wall_time / max(n_results, 1),
+        "phases": phases,
+    }
+
+
+def compare_to_baseline(result, baseline, tolerance):
+    """Print the differences to a baseline result; True if throughput regressed"""
+    if result["config"] != baseline["config"]:
+        print("Warning: baseline was recorded with a different configuration")
+    print(f"{'':14} {'baseline':>10} {'current':>10} {'change':>8}")
+    rows = [("time/point", baseline["time_per_point"], result["time_per_point"])]
+    rows += [
+        (phase, baseline["phases"].get(phase, 0.0), result["phases"][phase])
+        for phase in SWEEP_PHASES
+    ]
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+7.1f}%" if before else ""
+        print(f"{name:14} {before:10.3f} {after:10.3f} {change:>8}")
+
+    regressed = result["time_per_point"] > baseline["time_per_point"] * (1 + tolerance)
+    if regressed:
+        print(f"REGRESSION: time per point is more than {tolerance:.0%} above baseline")
+    return regressed
+
+
+def bench_sweep(args):
+    """End-to-end sweep against the simulator with a per-phase time breakdown"""
+    result = run_sweep(args)
+
+    unit = "simulated s" if args.virtual else "s"
+    print(
+        f"\n{result['points']} points in {result['wall_time']:.2f} {unit}, "
+        f"{result['time_per_point'] * 1000:.1f} ms per point"
+    )
+    for phase, seconds in result["phases"].items():
+        share = seconds / result["wall_time"] * 100 if result["wall_time"] else 0
+        print(f"  {phase:14} {seconds:10.3f} {unit} {share:5.1f}%")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(result, output_file, indent=2)
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(result, baseline_file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare_to_baseline(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    stations = subparsers.add_parser("stations", help=bench_stations.__doc__)
+    stations.add_argument("--stations", type=int, nargs="+", default=[1, 2, 4])
+    stations.add_argument("--freqs", type=int, default=8)
+    stations.add_argument("--points", type=int, default=2)
+    stations.add_argument("--delay", type=float, default=0.05)
+    stations.set_defaults(func=bench_stations)
+
+    startup = subparsers.add_parser("startup", help=bench_startup.__doc__)
+    startup.add_argument("--budget-ms", type=float, default=150)
+    startup.add_argument("--modules", nargs="+", default=MOCK_PATH_MODULES)
+    startup.add_argument("--top", type=int, default=10)
+    startup.set_defaults(func=bench_startup)
+
+    datalogger = subparsers.add_parser("datalogger", help=bench_datalogger.__doc__)
+    datalogger.add_argument("--rows", type=int, default=20000)
+    datalogger.add_argument("--batch-size", type=int, default=50)
+    datalogger.set_defaults(func=bench_datalogger)
+
+    transfer = subparsers.add_parser("transfer", help=bench_transfer.__doc__)
+    transfer.add_argument(
+        "--points", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    transfer.add_argument("--repeat", type=int, default=3)
+    transfer.add_argument("--link-mbit", type=float, default=100)
+    transfer.set_defaults(func=bench_transfer)
+
+    virtual = subparsers.add_parser("virtual", help=bench_virtual.__doc__)
+    virtual.add_argument("--freqs", type=int, default=60)
+    virtual.add_argument("--points", type=int, default=5)
+    virtual.add_argument("--delay", type=float, default=2.0)
+    virtual.add_argument("--adaptive", action="store_true")
+    virtual.add_argument(
+        "--traces",
+        action="store_true",
+        help="analyze AM/FM points from demodulated trace captures",
+    )
+    virtual.set_defaults(func=bench_virtual)
+
+    instrumentation = subparsers.add_parser(
+        "instrumentation", help=bench_instrumentation.__doc__
+    )
+    instrumentation.add_argument("--freqs", type=int, default=20)
+    instrumentation.add_argument("--points", type=int, default=5)
+    instrumentation.add_argument("--delay", type=float, default=0.5)
+    instrumentation.add_argument("--repeat", type=int, default=5)
+    instrumentation.add_argument("--trace", help="write the traced run as JSON")
+    instrumentation.set_defaults(func=bench_instrumentation)
+
+    records = subparsers.add_parser("records", help=bench_records.__doc__)
+    records.add_argument("--points", type=int, default=100_000)
+    records.set_defaults(func=bench_records)
+
+    sweep = subparsers.add_parser("sweep", help=bench_sweep.__doc__)
+    sweep.add_argument("--freqs", type=int, default=10)
+    sweep.add_argument("--depths", type=int, default=4)
+    sweep.add_argument("--devs", type=int, default=0, help="FM deviation points")
+    sweep.add_argument("--levels", type=int, default=4)
+    sweep.add_argument("--delay", type=float, default=0.5)
+    sweep.add_argument("--command-latency", type=float, default=0.005)
+    sweep.add_argument("--transfer-rate", type=float, default=10e6)
+    sweep.add_argument("--settle-tau", type=float, default=0.2)
+    sweep.add_argument("--virtual", action="store_true", help="run on a VirtualClock")
+    sweep.add_argument("--adaptive", action="store_true")
+    sweep.add_argument(
+        "--traces",
+        action="store_true",
+        help="analyze AM/FM points from demodulated trace captures",
+    )
+    sweep.add_argument(
+        "--plan-order",
+        choices=["phase_major", "frequency_major", "shared_tuning"],
+        default="phase_major",
+    )
+    sweep.add_argument("--formats", nargs="+", default=["csv"])
+    sweep.add_argument("--output", help="write the result as JSON")
+    sweep.add_argument("--baseline", help="baseline JSON to compare against")
+    sweep.add_argument("--save-baseline", action="store_true")
+    sweep.add_argument("--tolerance", type=float, default=0.1)
+    sweep.set_defaults(func=bench_sweep)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
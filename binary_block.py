@@ -0,0 +1,46 @@
+import numpy as np
+
+# FORM:BORD setting -> NumPy byte order of the transferred values
+BYTE_ORDERS = {"SWAP": "<", "NORM": ">"}
+
+
+def configure_binary_format(instrument, byte_order="SWAP"):
+    """Switch trace transfers to 32-bit IEEE floats in the given byte order"""
+    instrument.write_str(f"FORM REAL,32;:FORM:BORD {byte_order}")
+
+
+def block_dtype(byte_order="SWAP"):
+    return np.dtype(f"{BYTE_ORDERS[byte_order]}f4")
+
+
+def parse_block(block, dtype=None):
+    """View the payload of an IEEE 488.2 definite-length block (#<n><length><data>)
+
+    The returned array shares memory with block; nothing is copied.
+    """
+    dtype = block_dtype() if dtype is None else dtype
+    view = memoryview(block)
+    if view[0:1] != b"#":
+        raise ValueError("Not an IEEE 488.2 binary block")
+    digits = int(bytes(view[1:2]))
+    if digits == 0:
+        raise ValueError("Indefinite-length blocks are not supported")
+    length = int(bytes(view[2 : 2 + digits]))
+    start = 2 + digits
+    if len(view) < start + length:
+        raise ValueError(f"Block truncated: {len(view) - start} of {length} bytes")
+    return np.frombuffer(view[start : start + length], dtype=dtype)
+
+
+def read_block(instrument, query, byte_order="SWAP"):
+    """Query a binary block and return it as a NumPy array without copying
+
+    Works with RsInstrument and the mock instruments (query_bin_block, which
+    returns the payload) and with raw VISA sessions (write + read_raw). The
+    result is a read-only view on the received bytes.
+    """
+    dtype = block_dtype(byte_order)
+    if hasattr(instrument, "query_bin_block"):
+        return np.frombuffer(instrument.query_bin_block(query), dtype=dtype)
+    instrument.write(query)
+    return parse_block(instrument.read_raw(), dtype)
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import threading
+import time
+
+
+class RealClock:
+    """Wall clock: sleep() blocks, sleep_async() awaits, now() is the local time"""
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def sleep_async(self, seconds):
+        import asyncio
+
+        await asyncio.sleep(max(seconds, 0))
+
+    def now(self):
+        return datetime.now()
+
+
+class VirtualClock:
+    """Simulated clock: sleep() advances time instantly and deterministically
+
+    elapsed is the wall time the same run would have taken. Sleeps from
+    several threads add up, so parallel stations are not modelled.
+    """
+
+    def __init__(self, start=None):
+        self.start = start or datetime.now()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        return self.elapsed
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            with self._lock:
+                self.elapsed += seconds
+
+    async def sleep_async(self, seconds):
+        import asyncio
+
+        # Advance at once, but still let other tasks run
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    """Clock used by code that is not given one explicitly"""
+    return _clock
+
+
+def set_clock(clock):
+    """Install clock as the default and return the previous one"""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+@contextmanager
+def use_clock(clock):
+    """Run a block with clock as the default clock"""
+    previous = set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
@@ -1,92 +1,9 @@
-from time import sleep
-from RsInstrument.RsInstrument import RsInstrument
-import paho.mqtt.client as paho
-from paho import mqtt
-import random
-
-
-class MockFSMR:
-    def __init__(self):
-        self.idn_string = "Mock FSMR26"
-        self.visa_manufacturer = "Mock Manufacturer"
-        self.instrument_options = ["Mock Option 1", "Mock Option 2"]
-        self.last_freq = None
-        self.last_command = None
-
-    def write_str(self, command):
-        self.last_command = command
-        sleep(0.1)  # Simulate command delay
-        if "FREQ:CENT" in command:
-            self.last_freq = command.split()[-1]
-
-    def query_str(self, command):
-        if "SYST:ERR?" in command:
-            return (
-                "No error"
-                if random.random() > 0.1
-                else "Mock Error: Temperature warning"
-            )
-        return "Mock Response"
-
-    def query_float(self, command):
-        try:
-            if "ADEM:AM?" in command:
-                # Simulate AM measurement with some variation
-                base_value = (
-                    float(self.last_command.split()[-1].replace("PCT", ""))
-                    if self.last_command
-                    else 50
-                )
-                return base_value + random.uniform(-2, 2)
-            elif "ADEM:DIST:RES?" in command:
-                # Simulate distortion that increases with frequency
-                freq_mhz = float(self.last_freq.split()[0]) if self.last_freq else 100
-                return (freq_mhz / 3000) * random.uniform(1, 5)
-            elif "CARR:RES?" in command:
-                # Simulate level measurement
-                return (
-                    float(self.last_command.split()[-1]) + random.uniform(-0.5, 0.5)
-                    if self.last_command
-                    else 0
-                )
-            elif "CARR:SUNC?" in command:
-                # Simulate uncertainty that increases with frequency
-                freq_mhz = float(self.last_freq.split()[0]) if self.last_freq else 100
-                return (freq_mhz / 3000) * random.uniform(0.1, 0.3)
-            return random.uniform(0, 100)
-        except Exception as e:
-            print(f"Error in query_float: {e}")
-            return 0.0
-
-    def close(self):
-        pass
-
-
-class MockSigGen:
-    def __init__(self):
-        self.idn_string = "Mock Signal Generator"
-        self.visa_manufacturer = "Mock Manufacturer"
-        self.instrument_options = ["Mock Option 1", "Mock Option 2"]
-        self.current_freq = None
-        self.current_power = None
-
-    def write_str(self, command):
-        sleep(0.1)  # Simulate command delay
-        if "FREQ:CW" in command:
-            self.current_freq = command.split()[-1]
-        elif "POW:LEV:IMM:AMPL" in command:
-            self.current_power = command.split()[-1]
+from clock import get_clock
+from scpi_session import query_values
+from scpi_simulator import create_simulated_instruments
 
-    def write(self, command):
-        self.write_str(command)
-
-    def query_str(self, command):
-        if "SYST:ERR?" in command:
-            return "No error" if random.random() > 0.1 else "Mock Error: PLL unlocked"
-        return "Mock Response"
-
-    def close(self):
-        pass
+# Upper bound for a single *OPC? wait, in milliseconds
+OPC_TIMEOUT_MS = 60000
 
 
 # Modify instrument_utils.py to include mock functionality
@@ -94,8 +11,10 @@ def initialize_instruments(config: object, use_mock: object = True) -> object:
     """Initialize real or mock instruments based on use_mock parameter"""
     if use_mock:
         print("Initializing mock instruments...")
-        return MockFSMR(), MockSigGen()
+        return create_simulated_instruments()
     else:
+        # Imported here so mock runs do not need (or pay for) the VISA stack
+        from RsInstrument.RsInstrument import RsInstrument
 
         try:
             FSMR_STD = RsInstrument(config["fsmr_address"], True, False)
@@ -126,9 +45,65 @@ def reset_instruments(FSMR_STD, SigGen_UUC):
     FSMR_STD.write_str("*RST")
     SigGen_UUC.write_str("*RST")
 
+
+def wait_for_opc(instrument, fallback_delay, timeout=None):
+    """Wait until pending operations complete (*OPC?), else sleep fallback_delay seconds"""
+    try:
+        instrument.query_opc(OPC_TIMEOUT_MS if timeout is None else timeout)
+    except Exception as e:
+        print(f"*OPC? synchronization failed ({e}), waiting {fallback_delay} s instead")
+        get_clock().sleep(fallback_delay)
+
+
+def read_error_queue(instrument, max_errors=20):
+    """Read SYST:ERR? until the queue is empty; returns the entries read"""
+    errors = []
+    for _ in range(max_errors):
+        error = instrument.query_str("SYST:ERR?").strip()
+        if error.split(",", 1)[0].strip() in ("0", "+0"):
+            break
+        errors.append(error)
+    return errors
+
+
+def read_settled(instrument, queries, max_delay, tolerance, interval=0.05, samples=3):
+    """Poll queries until the readings settle; returns (values, seconds waited)
+
+    A reading is accepted once `samples` consecutive readings agree within
+    tolerance, one absolute limit per query (None = not checked). After
+    max_delay seconds the latest reading is accepted regardless.
+    """
+    clock = get_clock()
+    start = clock.monotonic()
+    history = []
+    while True:
+        clock.sleep(min(interval, max_delay - (clock.monotonic() - start)))
+        values = query_values(instrument, queries)
+        elapsed = clock.monotonic() - start
+        history = (history + [values])[-samples:]
+        if len(history) == samples and is_settled(history, tolerance):
+            return values, elapsed
+        if elapsed >= max_delay:
+            return values, elapsed
+
+
+def is_settled(history, tolerance):
+    """True if the readings in history agree within tolerance (see read_settled)"""
+    return all(
+        limit is None
+        or max(reading[index] for reading in history)
+        - min(reading[index] for reading in history)
+        <= limit
+        for index, limit in enumerate(tolerance)
+    )
+
+
 def setup_mqtt_client(config):
     """Initialize MQTT client with configuration"""
     try:
+        import paho.mqtt.client as paho
+        from paho import mqtt
+
         client = paho.Client(client_id="calibration", protocol=paho.MQTTv5)
         client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
         client.username_pw_set(config["username"], config["password"])
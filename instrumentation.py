@@ -0,0 +1,228 @@
+"""Optional timing of SCPI calls and calibration phases
+
+Nothing is recorded until enable_instrumentation() is called; until then
+traced functions cost one global lookup and span() returns a shared no-op
+context manager.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+import functools
+import json
+import threading
+from time import perf_counter
+
+from scpi_session import split_commands
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [
+    0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000
+]
+
+_active = None
+_NO_SPAN = nullcontext()
+
+
+class LatencyHistogram:
+    """Call latencies in fixed log-spaced buckets"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, milliseconds):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def quantile(self, p):
+        """Upper bound of the bucket holding the p-quantile"""
+        rank = p * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return LATENCY_BUCKETS_MS[index]
+                return self.max_ms
+        return 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": self.max_ms,
+            "buckets": dict(zip([*map(str, LATENCY_BUCKETS_MS), "inf"], self.counts)),
+        }
+
+
+class Instrumentation:
+    """Latency histograms per instrument and SCPI header, and timed spans"""
+
+    def __init__(self, record_calls=True):
+        # Also keep every SCPI call as a trace event, not only the histograms
+        self.record_calls = record_calls
+        self.histograms = {}
+        self.events = []
+        self.started = perf_counter()
+        self._lock = threading.Lock()
+
+    def record_call(self, instrument, method, message, start, end):
+        key = f"{instrument} {_headers(message)}"
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.add((end - start) * 1000)
+            if self.record_calls:
+                self.events.append(
+                    (f"{instrument}.{method}", "scpi", start, end, {"message": message})
+                )
+
+    @contextmanager
+    def span(self, name, **args):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            with self._lock:
+                self.events.append((name, "phase", start, end, args))
+
+    def metrics(self):
+        """Latency summary per instrument and header"""
+        with self._lock:
+            return {
+                key: histogram.summary() for key, histogram in self.histograms.items()
+            }
+
+    def chrome_trace(self):
+        """Events in the Chrome trace format (chrome://tracing, Perfetto)"""
+        with self._lock:
+            events = list(self.events)
+        return {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": (start - self.started) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": 1,
+                    "tid": category,
+                    "args": args,
+                }
+                for name, category, start, end, args in events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+    def start_mqtt_metrics(
+        self, mqtt_client, topic="calibration/metrics", interval=10
+    ):
+        """Publish metrics() every interval seconds until the returned event is set"""
+        stop = threading.Event()
+
+        def publish():
+            while not stop.wait(interval):
+                mqtt_client.publish(topic, json.dumps(self.metrics()), qos=0)
+            mqtt_client.publish(topic, json.dumps(self.metrics()), qos=0)
+
+        threading.Thread(target=publish, daemon=True).start()
+        return stop
+
+
+class InstrumentedSession:
+    """Instrument wrapper recording the latency of every SCPI call"""
+
+    def __init__(self, instrument, name, instrumentation):
+        self.instrument = instrument
+        self.name = name
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, attribute):
+        return getattr(self.instrument, attribute)
+
+    def write_str(self, message):
+        return self._timed("write_str", message, message)
+
+    def write(self, message):
+        return self._timed("write", message, message)
+
+    def query_str(self, message):
+        return self._timed("query_str", message, message)
+
+    def query_float(self, message):
+        return self._timed("query_float", message, message)
+
+    def query_bin_block(self, message):
+        return self._timed("query_bin_block", message, message)
+
+    def query_opc(self, timeout=0):
+        return self._timed("query_opc", "*OPC?", timeout)
+
+    def _timed(self, method, message, argument):
+        start = perf_counter()
+        try:
+            return getattr(self.instrument, method)(argument)
+        finally:
+            self.instrumentation.record_call(
+                self.name, method, message, start, perf_counter()
+            )
+
+
+def enable_instrumentation(record_calls=True):
+    """Start recording; returns the active Instrumentation"""
+    global _active
+    _active = Instrumentation(record_calls)
+    return _active
+
+
+def disable_instrumentation():
+    """Stop recording; returns what was recorded"""
+    global _active
+    instrumentation, _active = _active, None
+    return instrumentation
+
+
+def get_instrumentation():
+    return _active
+
+
+def instrument_session(instrument, name):
+    """Wrap instrument for latency recording if instrumentation is enabled"""
+    if _active is None:
+        return instrument
+    return InstrumentedSession(instrument, name, _active)
+
+
+def span(name, **args):
+    """Context manager timing a phase; a no-op while instrumentation is off"""
+    if _active is None:
+        return _NO_SPAN
+    return _active.span(name, **args)
+
+
+def traced(function):
+    """Decorator recording a span for every call of function"""
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return function(*args, **kwargs)
+        with _active.span(function.__name__):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def _headers(message):
+    return ";".join(command.split()[0].upper() for command in split_commands(message))
@@ -1,122 +1,118 @@
 # level_measurement.py
-from time import sleep
-from datetime import datetime
-import json
-import random
-
-
-def setup_level_measurement(FSMR_STD, SigGen_UUC, freq_display, freq_value):
-    """Setup FSMR for level measurements"""
-
-    SigGen_UUC.write_str("SOUR:FREQ:MODE CW")
-    SigGen_UUC.write(f"SOUR:FREQ:CW {freq_value}")
-    SigGen_UUC.write_str("SOUR:POW:LEV:IMM:AMPL 0")
-    SigGen_UUC.write_str("OUTP:ALL:STAT ON")
-
-    FSMR_STD.write_str("SYST:DISP:UPD ON")
-    FSMR_STD.write_str("INST:SEL MREC")
-    FSMR_STD.write_str("ROSC:SOUR EXT")
-    FSMR_STD.write_str("SENS:PMET:STAT ON")
-    sleep(8)
-
-    FSMR_STD.write_str("UNIT:PMET:POW DBM")
-    FSMR_STD.write_str("SYST:COMM:RDEV:PMET:TYPE 'NRVD'")
-    FSMR_STD.write_str("CAL:PMET:ZERO:AUTO ONCE; *WAI")
-    sleep(20)
-
-    FSMR_STD.write_str("POW:AC:STAT ON")
-    FSMR_STD.write(f"FREQ:CENT {freq_display}")
-
-    sleep(8)
-
-    FSMR_STD.write_str("SWE:TIME 1S")
-    FSMR_STD.write_str("SENS:POW:AC:AVER:AUTO ON")
-    FSMR_STD.write_str("SENS:DET:FUNC NARROW")
-    FSMR_STD.write_str("INP:ATT:REC:AUTO:STAT ON")
-
-    FSMR_STD.write(f"FREQ:CENT {freq_display}")
-    FSMR_STD.write_str("CORR:COLL PSPL")
-    sleep(31)
-
-    SigGen_UUC.write_str("SOUR:FREQ:MODE CW")
-    SigGen_UUC.write(f"SOUR:FREQ:CW {freq_value}")
-    SigGen_UUC.write_str("OUTP:ALL:STAT ON")
-
-
+from instrumentation import traced
+from measurement_plan import compile_setup, perform_measurements, run_setup
+from results import LevelResult
+
+# Settling limits per reading in adaptive mode: level (dB), uncertainty (dB)
+SETTLE_TOLERANCE = (0.02, None)
+
+
+# Setup stages (see measurement_plan) that enable and zero the power meter;
+# the zero runs in the measuring receiver mode with the external reference
+POWER_METER_SETUP = [
+    ("fsmr", ["INST:SEL MREC", "ROSC:SOUR EXT", "SENS:PMET:STAT ON"], 8),
+    (
+        "fsmr",
+        [
+            "UNIT:PMET:POW DBM",
+            "SYST:COMM:RDEV:PMET:TYPE 'NRVD'",
+            "CAL:PMET:ZERO:AUTO ONCE",
+            "*WAI",
+        ],
+        20,
+    ),
+]
+
+
+@traced
+def setup_power_meter(FSMR_STD, settings=None):
+    """Enable and zero the power meter attached to the FSMR
+
+    With settings (see measurement_plan.compile_setup) the commands are
+    recorded there, so the level setup that follows does not repeat them.
+    """
+    run_setup(
+        FSMR_STD, None, compile_setup({"setup": POWER_METER_SETUP}, None, None, settings)
+    )
+
+
+LEVEL_MEASUREMENT = {
+    "title": "level",
+    "label": "Level",
+    "topic": "calibration/level_measurement",
+    "setup": [
+        (
+            "siggen",
+            [
+                "SOUR:FREQ:MODE CW",
+                "SOUR:FREQ:CW {freq_value}",
+                "SOUR:POW:LEV:IMM:AMPL 0",
+                "OUTP:ALL:STAT ON",
+                "SOUR:AM:STAT OFF",
+                "SOUR:FM:STAT OFF",
+            ],
+            None,
+        ),
+        ("fsmr", ["SYST:DISP:UPD ON", "INST:SEL MREC", "ROSC:SOUR EXT"], None),
+        ("fsmr", ["POW:AC:STAT ON", "FREQ:CENT {freq_display}"], 8),
+        (
+            "fsmr",
+            [
+                "SWE:TIME 1S",
+                "SENS:POW:AC:AVER:AUTO ON",
+                "SENS:DET:FUNC NARROW",
+                "INP:ATT:REC:AUTO:STAT ON",
+                "CORR:COLL PSPL",
+            ],
+            31,
+        ),
+    ],
+    "point": ("siggen", "SOUR:POW:LEV:IMM:AMPL {level}"),
+    "point_key": "level",
+    "queries": ["CALC:MARK:FUNC:ADEM:CARR:RES?", "CALC:MARK:FUNC:ADEM:CARR:SUNC?"],
+    "decimals": (3, 4),
+    "record": LevelResult,
+    "tolerance": SETTLE_TOLERANCE,
+}
+
+
+@traced
+def setup_level_measurement(
+    FSMR_STD, SigGen_UUC, freq_display, freq_value, zero_power_meter=True
+):
+    """Setup FSMR for level measurements
+
+    Pass zero_power_meter=False when setup_power_meter() already ran after the
+    last reset, so the power meter is not zeroed again for every frequency.
+    """
+    settings = {}
+    if zero_power_meter:
+        setup_power_meter(FSMR_STD, settings)
+    run_setup(
+        FSMR_STD,
+        SigGen_UUC,
+        compile_setup(LEVEL_MEASUREMENT, freq_display, freq_value, settings),
+    )
+
+
+@traced
 def perform_level_measurements(
-    FSMR_STD, SigGen_UUC, freq_display, freq_value, level_points, mqtt_client
+    FSMR_STD,
+    SigGen_UUC,
+    freq_display,
+    freq_value,
+    level_points,
+    mqtt_client,
+    adaptive=False,
 ):
     """Perform level measurements for a frequency point"""
-    results = []
-
-    # FSMR_STD.write_str(f"FREQ:CENT {freq_display}") ### moved to 36 ###
-    # FSMR_STD.write_str("CORR:COLL PSPL")
-    # sleep(31)
-
-    # SigGen_UUC.write_str("SOUR:FREQ:MODE CW") ### moved to 12 ###
-    # SigGen_UUC.write_str(f"SOUR:FREQ:CW {freq_value}")
-    # SigGen_UUC.write_str("OUTP:ALL:STAT ON")
-
-    for point in level_points:
-        SigGen_UUC.write(f"SOUR:POW:LEV:IMM:AMPL {point['level']}")
-        sleep(point["delay"])
-
-        level = FSMR_STD.query_float("CALC:MARK:FUNC:ADEM:CARR:RES?")
-        uncertainty = FSMR_STD.query_float("CALC:MARK:FUNC:ADEM:CARR:SUNC?")
-
-        result = {
-            "type": "level_measurement",
-            "frequency": freq_display,
-            "level": point["level"],
-            "measured": round(level, 3),
-            "uncertainty": round(uncertainty, 4),
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-        }
-        results.append(result)
-
-        if mqtt_client:
-            mqtt_client.publish(
-                "calibration/level_measurement", json.dumps(result), qos=1
-            )
-        sleep(point["delay"])
-
-    return results
-
-
-def perform_mock_level_measurements(
-    FSMR_STD, SigGen_UUC, freq_display, freq_value, level_points, mqtt_client
-):
-    """Perform mock level measurements"""
-    results = []
-    try:
-        for point in level_points:
-            sleep(point["delay"] * 0.1)  # Shorter delay for testing
-
-            # Generate mock measurements
-            base_level = float(point["level"])
-            measured_level = base_level + random.uniform(-0.3, 0.3)
-            uncertainty = (
-                float(freq_value.replace("e6", "").replace("e9", "000")) / 3000
-            ) * random.uniform(0.1, 0.3)
-
-            result = {
-                "type": "level_measurement",
-                "frequency": freq_display,
-                "level": point["level"],
-                "measured": round(measured_level, 3),
-                "uncertainty": round(uncertainty, 4),
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-            }
-            results.append(result)
-
-            if mqtt_client:
-                mqtt_client.publish(
-                    "calibration/level_measurement", json.dumps(result), qos=1
-                )
-                sleep(0.1)  # Small delay between publications
-
-    except Exception as e:
-        print(f"Error in mock level measurements: {e}")
-        raise
-
-    return results
+    return perform_measurements(
+        LEVEL_MEASUREMENT,
+        FSMR_STD,
+        SigGen_UUC,
+        freq_display,
+        freq_value,
+        level_points,
+        mqtt_client,
+        adaptive=adaptive,
+    )
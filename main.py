@@ -1,10 +1,7 @@
-import pyvisa
 import random
-from RsInstrument.RsInstrument import RsInstrument
-import paho.mqtt.client as paho
-from paho import mqtt
-from datetime import datetime
+import sys
 
+import config
 from config import (
     FREQ_POINTS,
     LEVEL_POINTS,
@@ -18,32 +15,70 @@ from config import (
 from instrument_utils import (
     setup_mqtt_client,
     initialize_instruments,
-    reset_instruments,
 )
-from am_modulation import (
-    setup_am_modulation,
-    perform_am_measurements,
-    perform_mock_am_measurements,
-)
-
+from am_modulation import setup_am_modulation, perform_am_measurements
 from level_measurement import (
+    setup_power_meter,
     setup_level_measurement,
     perform_level_measurements,
-    perform_mock_level_measurements,
 )
 from notification_manager import NotificationManager
-from time import sleep
-
-
-def run_calibration(use_mock=True):
-    """Main calibration routine"""
-    notification_manager = NotificationManager(EMAIL_CONFIG, SMS_CONFIG)
+from instrumentation import (
+    disable_instrumentation,
+    enable_instrumentation,
+    instrument_session,
+)
+from mqtt_publisher import BufferedPublisher
+from scpi_session import SharedSession, StateCachingSession
+from result_sink import STATION_COLUMN, ResultSink
+from run_journal import RunJournal, load_journal, remove_completed
+from scheduler import (
+    PHASE_MAJOR,
+    SHARED_TUNING,
+    build_execution_plan,
+    execute_plan,
+)
+from station_runner import SPLIT_FREQUENCIES, run_stations
+from utils.instrument_monitor import InstrumentMonitor
+
+
+def run_calibration(
+    use_mock=True,
+    plan_order=SHARED_TUNING,
+    result_formats=("csv",),
+    journal_path="./calibration_journal.jsonl",
+    resume=False,
+    adaptive=False,
+    trace_path=None,
+    analyze_traces=False,
+):
+    """Main calibration routine
+
+    With trace_path set, SCPI latencies and phase timings are recorded,
+    published periodically over MQTT and written to trace_path as a
+    Chrome trace (chrome://tracing, Perfetto). With analyze_traces=True
+    the AM and FM points are analyzed from captures of the demodulated
+    trace (see scheduler.execute_plan).
+    """
+    journal_state = load_journal(journal_path) if resume else None
+    journal = RunJournal(journal_path, resume=resume)
+    notification_manager = NotificationManager(
+        EMAIL_CONFIG, SMS_CONFIG, journal=journal
+    )
+    mqtt_client = None
+    if journal_state:
+        notification_manager.restore(journal_state)
+    instrumentation = enable_instrumentation() if trace_path else None
+    stop_metrics = None
+    monitor = InstrumentMonitor(notification_manager)
 
     try:
         # Initialize MQTT
         mqtt_client = setup_mqtt_client(MQTT_CONFIG)
         if not mqtt_client:
             notification_manager.log_error("Failed to initialize MQTT client")
+        else:
+            mqtt_client = BufferedPublisher(mqtt_client)
 
         # Initialize instruments
         FSMR_STD, SigGen_UUC = initialize_instruments(
@@ -54,84 +89,163 @@ def run_calibration(use_mock=True):
             notification_manager.log_error("Failed to initialize instruments")
             return
 
-        # Open result files
-        with open("./AM_MOD_Results.txt", "w") as am_file, open(
-            "./LEVEL_Results.txt", "w"
-        ) as level_file,  open(
-            "./FM_MOD_Results.txt", "w") as fm_file:
-
-            am_file.write("Frequency,AM Modulation (%),Distortion (%),Timestamp\n")
-            level_file.write("Frequency,Measured,Uncertainty,Timestamp\n")
-            fm_file.write("Frequency,FM Modulation (Hz),Distortion (%),Timestamp\n")
+        # Suppress SCPI writes that would not change instrument state; only
+        # the writes that reach the instruments are timed, and the health
+        # monitor shares each session through its lock
+        FSMR_STD = StateCachingSession(
+            SharedSession(instrument_session(FSMR_STD, "FSMR")), "FSMR"
+        )
+        SigGen_UUC = StateCachingSession(
+            SharedSession(instrument_session(SigGen_UUC, "SigGen")), "SigGen"
+        )
+        monitor.start_monitoring(FSMR_STD, SigGen_UUC)
+        if instrumentation and mqtt_client:
+            stop_metrics = instrumentation.start_mqtt_metrics(mqtt_client)
+
+        # Open result files (extend them when resuming); commits are
+        # fsync'ed so the journal never marks points whose rows are not
+        # on disk yet
+        with ResultSink(
+            "./", formats=result_formats, durable=True, append=resume
+        ) as sink:
+
+            def write_results(measurement_type, freq, results):
+                # Log measurements, commit them once per frequency step and
+                # only then mark the points as done in the journal (a crash
+                # in between repeats the step on resume, see RunJournal)
+                for result in results:
+                    notification_manager.log_measurement(result, measurement_type)
+                sink.write(measurement_type, results)
+                sink.commit()
+                journal.record_results(measurement_type, freq, results)
 
             # Main measurement loop
-            for freq in FREQ_POINTS:
-                print(f"\nProcessing frequency: {freq['display']}")
-
-                try:
-                    # AM Modulation measurements
-                    reset_instruments(FSMR_STD, SigGen_UUC)
-                    print("Performing AM modulation measurements...")
-                    setup_am_modulation(
-                        FSMR_STD, SigGen_UUC, freq["display"], freq["value"]
-                    )
-                    am_results = perform_am_measurements(
-                        FSMR_STD,
-                        SigGen_UUC,
-                        freq["display"],
-                        freq["value"],
-                        MOD_DEPTHS,
-                        mqtt_client,
-                    )
-
-                    # Level measurements
-                    reset_instruments(FSMR_STD, SigGen_UUC)
-                    print("Performing level measurements...")
-                    setup_level_measurement(
-                        FSMR_STD, SigGen_UUC, freq["display"], freq["value"]
-                    )
-                    level_results = perform_level_measurements(
-                        FSMR_STD,
-                        SigGen_UUC,
-                        freq["display"],
-                        freq["value"],
-                        LEVEL_POINTS,
-                        mqtt_client,
-                    )
-
-                    # Log level measurements
-                    for result in level_results:
-                        notification_manager.log_measurement(result, "level")
-                        level_file.write(
-                            f"{result['frequency']},{result['measured']},{result['uncertainty']},{result['timestamp']}\n"
-                        )
-                        level_file.flush()
-
-                except Exception as e:
-                    error_msg = (
-                        f"Error processing frequency {freq['display']}: {str(e)}"
-                    )
-                    notification_manager.log_error(error_msg)
-                    continue
+            plan = build_execution_plan(
+                FREQ_POINTS,
+                MOD_DEPTHS,
+                LEVEL_POINTS,
+                order=plan_order,
+                # FM points only where the config defines MOD_DEV
+                mod_devs=getattr(config, "MOD_DEV", ()),
+            )
+            if journal_state:
+                plan = remove_completed(plan, journal_state["completed"])
+                print(f"Resuming run: {len(journal_state['results'])} points done")
+            execute_plan(
+                plan,
+                FSMR_STD,
+                SigGen_UUC,
+                mqtt_client,
+                notification_manager,
+                write_results,
+                adaptive=adaptive,
+                trace=analyze_traces,
+            )
+            # Report errors queued since the last periodic check
+            monitor.check_instruments({"FSMR": FSMR_STD, "SigGen": SigGen_UUC})
+            journal.record_complete()
 
     except Exception as e:
         notification_manager.log_error(f"Critical error during calibration: {str(e)}")
     finally:
         # Cleanup
+        monitor.stop_monitoring()
+        for session in (locals().get("FSMR_STD"), locals().get("SigGen_UUC")):
+            if isinstance(session, StateCachingSession):
+                print(session.report())
         if "FSMR_STD" in locals():
             FSMR_STD.close()
         if "SigGen_UUC" in locals():
             SigGen_UUC.close()
+        if stop_metrics:
+            stop_metrics.set()
+        if instrumentation:
+            disable_instrumentation()
+            instrumentation.export_chrome_trace(trace_path)
+            print(f"Trace written to {trace_path}")
+        if mqtt_client:
+            mqtt_client.close()
+
+        # Send completion notification
+        notification_manager.send_completion_notification()
+        journal.close()
+
+
+def resume_calibration(
+    use_mock=True,
+    plan_order=SHARED_TUNING,
+    result_formats=("csv",),
+    journal_path="./calibration_journal.jsonl",
+    adaptive=False,
+    trace_path=None,
+    analyze_traces=False,
+):
+    """Continue an interrupted run_calibration, skipping completed points"""
+    run_calibration(
+        use_mock,
+        plan_order,
+        result_formats,
+        journal_path,
+        True,
+        adaptive,
+        trace_path,
+        analyze_traces,
+    )
+
+
+def run_multi_station_calibration(
+    use_mock=True,
+    mode=SPLIT_FREQUENCIES,
+    plan_order=PHASE_MAJOR,
+    result_formats=("csv",),
+):
+    """Calibration across all stations listed in INSTRUMENT_CONFIG["stations"]"""
+    notification_manager = NotificationManager(EMAIL_CONFIG, SMS_CONFIG)
+    mqtt_client = None
+
+    try:
+        # Initialize MQTT
+        mqtt_client = setup_mqtt_client(MQTT_CONFIG)
+        if not mqtt_client:
+            notification_manager.log_error("Failed to initialize MQTT client")
+        else:
+            mqtt_client = BufferedPublisher(mqtt_client)
+
+        results = run_stations(
+            INSTRUMENT_CONFIG,
+            FREQ_POINTS,
+            MOD_DEPTHS,
+            LEVEL_POINTS,
+            mqtt_client,
+            notification_manager,
+            use_mock=use_mock,
+            mode=mode,
+            plan_order=plan_order,
+            # FM points only where the config defines MOD_DEV
+            mod_devs=getattr(config, "MOD_DEV", ()),
+        )
+
+        # Write the merged results of all stations
+        with ResultSink(
+            "./", formats=result_formats, extra_columns=[STATION_COLUMN]
+        ) as sink:
+            for measurement_type, type_results in results.items():
+                for result in type_results:
+                    notification_manager.log_measurement(result, measurement_type)
+                sink.write(measurement_type, type_results)
+
+    except Exception as e:
+        notification_manager.log_error(f"Critical error during calibration: {str(e)}")
+    finally:
         if mqtt_client:
-            mqtt_client.loop_stop()
-            mqtt_client.disconnect()
+            mqtt_client.close()
 
         # Send completion notification
         notification_manager.send_completion_notification()
 
 
-def run_mock_calibration(use_mock=True):
-    """Run calibration with mock data"""
+def run_mock_calibration(use_mock=True, result_formats=("csv",)):
+    """Run calibration against the simulated instruments (scpi_simulator)"""
     from config import (
         FREQ_POINTS,
         LEVEL_POINTS,
@@ -153,22 +267,17 @@ def run_mock_calibration(use_mock=True):
         if not mqtt_client:
             notification_manager.log_error("Failed to initialize MQTT client")
             return
+        mqtt_client = BufferedPublisher(mqtt_client)
 
         # Initialize mock instruments
         FSMR_STD, SigGen_UUC = initialize_instruments(
             INSTRUMENT_CONFIG, use_mock=use_mock
         )
         print("Mock instruments initialized")
+        setup_power_meter(FSMR_STD)
 
         # Open result files
-        with open("./MOCK_AM_MOD_Results.txt", "w") as am_file, open(
-            "./MOCK_LEVEL_Results.txt", "w"
-            ) as level_file, open(
-            "./MOCK_FM_MOD_Results.txt", "w") as fm_file:
-
-            am_file.write("Frequency,AM Modulation (%),Distortion (%),Timestamp\n")
-            fm_file.write("Frequency,FM Modulation (Hz),Distortion (%),Timestamp\n")
-            level_file.write("Frequency,Measured,Uncertainty,Timestamp\n")
+        with ResultSink("./MOCK_", formats=result_formats) as sink:
 
             # Main measurement loop
             for freq in FREQ_POINTS:
@@ -183,7 +292,10 @@ def run_mock_calibration(use_mock=True):
 
                     # AM Modulation measurements
                     print("Performing mock AM modulation measurements...")
-                    am_results = perform_mock_am_measurements(
+                    setup_am_modulation(
+                        FSMR_STD, SigGen_UUC, freq["display"], freq["value"]
+                    )
+                    am_results = perform_am_measurements(
                         FSMR_STD,
                         SigGen_UUC,
                         freq["display"],
@@ -195,16 +307,18 @@ def run_mock_calibration(use_mock=True):
                     # Log AM measurements
                     for result in am_results:
                         notification_manager.log_measurement(result, "am")
-                        am_file.write(
-                            f"{result['frequency']},{result['amValue']},{result['distortion']},{result['timestamp']}\n"
-                        )
-                        am_file.flush()
-
-                    sleep(1)  # Small delay between measurement types
+                    sink.write("am", am_results)
 
                     # Level measurements
                     print("Performing mock level measurements...")
-                    level_results = perform_mock_level_measurements(
+                    setup_level_measurement(
+                        FSMR_STD,
+                        SigGen_UUC,
+                        freq["display"],
+                        freq["value"],
+                        zero_power_meter=False,
+                    )
+                    level_results = perform_level_measurements(
                         FSMR_STD,
                         SigGen_UUC,
                         freq["display"],
@@ -216,10 +330,8 @@ def run_mock_calibration(use_mock=True):
                     # Log level measurements
                     for result in level_results:
                         notification_manager.log_measurement(result, "level")
-                        level_file.write(
-                            f"{result['frequency']},{result['measured']},{result['uncertainty']},{result['timestamp']}\n"
-                        )
-                        level_file.flush()
+                    sink.write("level", level_results)
+                    sink.commit()
 
                 except Exception as e:
                     error_msg = (
@@ -235,13 +347,15 @@ def run_mock_calibration(use_mock=True):
         notification_manager.log_error(error_msg)
     finally:
         if mqtt_client:
-            mqtt_client.loop_stop()
-            mqtt_client.disconnect()
+            mqtt_client.close()
 
         # Send completion notification
         notification_manager.send_completion_notification()
 
 
 if __name__ == "__main__":
-    run_calibration(use_mock=False)
+    if sys.argv[1:] == ["resume"]:
+        resume_calibration(use_mock=False)
+    else:
+        run_calibration(use_mock=False)
     # run_mock_calibration()
@@ -0,0 +1,290 @@
+"""Measurement types described as data, and the setup compiler
+
+A measurement type (AM_MEASUREMENT, FM_MEASUREMENT, LEVEL_MEASUREMENT) is a
+dict with
+
+    "setup"       stages (instrument, commands, opc_wait) that prepare a
+                  frequency point; commands may use {freq_display} and
+                  {freq_value}, opc_wait is the *OPC? fallback delay in
+                  seconds or None for no wait
+    "point"       (instrument, command) sent for every point, formatted
+                  with the point dict
+    "point_key"   key of the swept value in the point dict
+    "queries"     readings taken at every point
+    "decimals"    rounding of each reading
+    "record"      result record class (results.py), built from the
+                  frequency, the point value and the readings
+    "tolerance"   settling limit per query in adaptive mode
+
+plus the MQTT topic and names used in messages.
+
+compile_setup() reduces a setup to the commands that change what earlier
+steps left on the instruments, so AM, FM and level run back to back at one
+frequency tune once and then only switch what differs between them
+(CALC2:FEED, SOUR:AM:STAT/SOUR:FM:STAT, ...).
+"""
+import json
+
+from clock import get_clock
+from instrument_utils import read_settled, wait_for_opc
+from instrumentation import traced
+from results import timestamps
+from scpi_session import (
+    batch,
+    is_action,
+    query_values,
+    split_command,
+    transaction,
+)
+
+
+def demodulation_setup(modulation, feed):
+    """Setup stages of the AM and FM measurements, which differ only in the
+    modulation switched on at the generator and the trace fed to CALC2"""
+    other = "FM" if modulation == "AM" else "AM"
+    return [
+        (
+            "siggen",
+            [
+                "SOUR:FREQ:MODE CW",
+                "SOUR:FREQ:CW {freq_value}",
+                "SOUR:POW:LEV:IMM:AMPL 0",
+                "OUTP:ALL:STAT ON",
+            ],
+            5,
+        ),
+        (
+            "fsmr",
+            [
+                "SYST:DISP:UPD ON",
+                "INST:SEL MREC",
+                "ROSC:SOUR EXT",
+                "POW:AC:STAT OFF",
+                f"CALC2:FEED {feed}",
+                "FREQ:CENT {freq_display}",
+            ],
+            8,
+        ),
+        (
+            "fsmr",
+            [
+                "ADEM:DET:PAV ON",
+                "ADEM:DET:THD ON",
+                "ADEM:DET:SINAD ON",
+                "FILT:HPAS ON",
+                "FILT:HPAS:FREQ 300 HZ",
+                "FILT:LPAS ON",
+                "FILT:LPAS:FREQ 3 KHZ",
+            ],
+            None,
+        ),
+        ("siggen", [f"SOUR:{other}:STAT OFF", f"SOUR:{modulation}:STAT ON"], None),
+    ]
+
+
+def compile_setup(measurement, freq_display, freq_value, settings=None):
+    """Stages of a measurement's setup that still have to be sent
+
+    settings maps (instrument, header) to the value last sent and is
+    updated as if the returned stages had run; without it the full setup
+    is returned. Actions (CORR:COLL, CAL, common commands) are always kept.
+    A stage left without commands loses its *OPC? wait too, and stages for
+    the same instrument that no wait separates are merged into one batch.
+    """
+    settings = {} if settings is None else settings
+    stages = []
+    for instrument, commands, opc_wait in measurement["setup"]:
+        pending = []
+        for command in commands:
+            command = command.format(freq_display=freq_display, freq_value=freq_value)
+            if record_setting(settings, instrument, command):
+                pending.append(command)
+        if not pending:
+            continue
+        if stages and stages[-1][0] == instrument and stages[-1][2] is None:
+            stages[-1] = (instrument, stages[-1][1] + pending, opc_wait)
+        else:
+            stages.append((instrument, pending, opc_wait))
+    return stages
+
+
+@traced
+def run_setup(FSMR_STD, SigGen_UUC, stages):
+    """Send compiled setup stages, each as one batch followed by its *OPC? wait
+
+    A stage is one transaction, so a health check on a shared session is
+    never sent between a stage and its *OPC? wait.
+    """
+    sessions = {"fsmr": FSMR_STD, "siggen": SigGen_UUC}
+    for instrument, commands, opc_wait in stages:
+        with transaction(sessions[instrument]):
+            with batch(sessions[instrument]) as session:
+                for command in commands:
+                    session.write_str(command)
+            if opc_wait is not None:
+                wait_for_opc(sessions[instrument], opc_wait)
+
+
+@traced
+def perform_measurements(
+    measurement,
+    FSMR_STD,
+    SigGen_UUC,
+    freq_display,
+    freq_value,
+    points,
+    mqtt_client,
+    adaptive=False,
+    settings=None,
+):
+    """Measure every point of a measurement type at the current frequency
+
+    With settings (see compile_setup) the point commands are recorded there.
+    """
+    results = []
+    sessions = {"fsmr": FSMR_STD, "siggen": SigGen_UUC}
+    instrument, template = measurement["point"]
+    point_key = measurement["point_key"]
+    queries = measurement["queries"]
+
+    for point in points:
+        command = template.format(**point)
+        sessions[instrument].write_str(command)
+        if settings is not None:
+            record_setting(settings, instrument, command)
+
+        if adaptive:
+            values, settle_time = read_settled(
+                FSMR_STD,
+                queries,
+                point["delay"],
+                point.get("tolerance", measurement["tolerance"]),
+            )
+            print(
+                f"{measurement['label']} {point[point_key]}: settled in "
+                f"{settle_time:.2f} s, saved {2 * point['delay'] - settle_time:.2f} s"
+            )
+        else:
+            get_clock().sleep(point["delay"])
+            values = query_values(FSMR_STD, queries)
+
+        result = make_result(measurement, freq_display, freq_value, point, values)
+        results.append(result)
+
+        if mqtt_client:
+            mqtt_client.publish(
+                measurement["topic"], json.dumps(result.to_dict()), qos=1
+            )
+
+        if not adaptive:
+            get_clock().sleep(point["delay"])
+
+    return results
+
+
+@traced
+def perform_trace_measurements(
+    measurement,
+    FSMR_STD,
+    SigGen_UUC,
+    freq_display,
+    freq_value,
+    points,
+    mqtt_client,
+    settings=None,
+):
+    """Measure every point of a modulation type from demodulated trace captures
+
+    The FSMR is switched to single sweeps of CAPTURE_TIME seconds, and the
+    demodulation sample rate it then uses (ADEM:SRAT?) is read once. Each
+    point is captured after its delay and fetched as a binary block; all
+    captures are analyzed together for depth or deviation, THD and SINAD
+    (see trace_analysis.analyze_tone). Continuous sweeps and ASCII transfers
+    are restored afterwards.
+    """
+    import numpy as np
+
+    from binary_block import configure_binary_format, read_block
+    from trace_analysis import CAPTURE_TIME, TRACE_QUERY, analyze_tone
+
+    if not points:
+        return []
+    sessions = {"fsmr": FSMR_STD, "siggen": SigGen_UUC}
+    instrument, template = measurement["point"]
+    clock = get_clock()
+
+    sweep = f"SWE:TIME {CAPTURE_TIME * 1e3:g}MS"
+    with batch(FSMR_STD) as fsmr:
+        configure_binary_format(fsmr)
+        fsmr.write_str("INIT:CONT OFF")
+        fsmr.write_str(sweep)
+    try:
+        sample_rate = float(FSMR_STD.query_str("ADEM:SRAT?"))
+        traces, stamps = [], []
+        for point in points:
+            command = template.format(**point)
+            sessions[instrument].write_str(command)
+            if settings is not None:
+                record_setting(settings, instrument, command)
+            clock.sleep(point["delay"])
+            with transaction(FSMR_STD):
+                FSMR_STD.write_str("INIT")
+                wait_for_opc(FSMR_STD, CAPTURE_TIME)
+                traces.append(read_block(FSMR_STD, TRACE_QUERY))
+            stamps.append(timestamps(clock))
+    finally:
+        with batch(FSMR_STD) as fsmr:
+            fsmr.write_str("INIT:CONT ON")
+            fsmr.write_str("FORM ASC")
+    if settings is not None:
+        record_setting(settings, "fsmr", sweep)
+
+    length = min(len(trace) for trace in traces)
+    analysis = analyze_tone(
+        np.stack([trace[:length] for trace in traces]), sample_rate
+    )
+    amplitude_decimals, thd_decimals = measurement["decimals"]
+    results = []
+    for index, point in enumerate(points):
+        result = measurement["record"](
+            freq_display,
+            float(freq_value),
+            point[measurement["point_key"]],
+            round(float(analysis["amplitude"][index]), amplitude_decimals),
+            round(float(analysis["thd"][index]), thd_decimals),
+            *stamps[index],
+            sinad=round(float(analysis["sinad"][index]), 2),
+        )
+        results.append(result)
+
+        if mqtt_client:
+            mqtt_client.publish(
+                measurement["topic"], json.dumps(result.to_dict()), qos=1
+            )
+
+    return results
+
+
+def make_result(measurement, freq_display, freq_value, point, values):
+    """Result record of one point from its raw readings, timestamped now"""
+    return measurement["record"](
+        freq_display,
+        float(freq_value),
+        point[measurement["point_key"]],
+        *(
+            round(value, decimals)
+            for value, decimals in zip(values, measurement["decimals"])
+        ),
+        *timestamps(get_clock()),
+    )
+
+
+def record_setting(settings, instrument, command):
+    """Note command in settings; False if it would not change anything"""
+    header, value = split_command(command)
+    if is_action(header):
+        return True
+    if settings.get((instrument, header)) == value:
+        return False
+    settings[(instrument, header)] = value
+    return True
@@ -0,0 +1,224 @@
+import json
+import os
+import queue
+import threading
+from time import monotonic, sleep
+
+
+class BufferedPublisher:
+    """Publishes MQTT messages from a background thread
+
+    Drop-in for the client returned by setup_mqtt_client: publish() only
+    queues the message, so measurements never wait on the broker. Messages
+    that cannot be queued, sent or acknowledged are appended to a spill file
+    and re-sent when the broker reconnects, when the queue has drained
+    (at most every REPLAY_INTERVAL seconds) and on close(); the spilled
+    messages being re-sent stay on disk (spill_path + ".replay") until
+    every one of them is acknowledged or spilled again.
+    """
+
+    # Seconds between replays of the spill file while the broker stays connected
+    REPLAY_INTERVAL = 5.0
+
+    def __init__(
+        self,
+        client,
+        max_queue=1000,
+        batch_by_frequency=False,
+        spill_path="./mqtt_spill.jsonl",
+        ack_timeout=30,
+    ):
+        self.client = client
+        self.batch_by_frequency = batch_by_frequency
+        self.spill_path = spill_path
+        self.ack_timeout = ack_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        # mid -> (message info, topic, payload, qos, sent at); only the
+        # worker thread touches it
+        self.in_flight = {}
+        self.published = 0
+        self.spilled = 0
+        self.replay_path = f"{spill_path}.replay"
+        # mids of re-sent spilled messages not yet acknowledged, None when
+        # no replay is in progress
+        self._replaying = None
+        self._next_replay = 0.0
+        self._deadline = None
+
+        self._batch = []
+        self._batch_key = None
+        self._spill_lock = threading.Lock()
+        self._connected = False
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def publish(self, topic, payload, qos=1):
+        """Queue a message; spills to disk instead of blocking when full"""
+        try:
+            self.queue.put_nowait((topic, payload, qos))
+        except queue.Full:
+            self._spill([(topic, payload, qos)])
+
+    def close(self, timeout=10):
+        """Drain the queue, wait for outstanding acks and stop the client
+
+        The worker sends what is queued, re-sends the spill file and spills
+        whatever is not acknowledged within timeout seconds. A worker still
+        busy after that (stuck in a blocking publish) is left running; the
+        messages it has not taken from the queue are spilled here.
+        """
+        self._deadline = monotonic() + timeout
+        self._stop.set()
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            self._spill(self._drain_queue())
+
+        print(f"MQTT: {self.published} messages published, {self.spilled} spilled to disk")
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            self._replay_spill()
+            try:
+                topic, payload, qos = self.queue.get(timeout=0.2)
+            except queue.Empty:
+                self._flush_batch()
+                self._check_acks()
+                continue
+
+            if self.batch_by_frequency:
+                self._add_to_batch(topic, payload, qos)
+            else:
+                self._send(topic, payload, qos)
+            self._check_acks()
+
+        self._flush_batch()
+        self._replay_spill(closing=True)
+        while self.in_flight and monotonic() < self._deadline:
+            self._check_acks()
+            sleep(0.1)
+        self._spill(
+            [(topic, payload, qos) for _, topic, payload, qos, _ in self.in_flight.values()]
+        )
+        self.in_flight.clear()
+        self._end_replay()
+
+    def _drain_queue(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def _add_to_batch(self, topic, payload, qos):
+        # One message per topic and frequency point
+        try:
+            key = (topic, json.loads(payload).get("frequency"))
+        except (ValueError, AttributeError):
+            key = None
+        if key is None or key != self._batch_key:
+            self._flush_batch()
+        self._batch_key = key
+        self._batch.append((topic, payload, qos))
+
+    def _flush_batch(self):
+        if not self._batch:
+            return
+        topic, _, qos = self._batch[0]
+        if len(self._batch) == 1:
+            self._send(*self._batch[0])
+        else:
+            payload = "[" + ",".join(payload for _, payload, _ in self._batch) + "]"
+            self._send(f"{topic}/batch", payload, qos)
+        self._batch = []
+        self._batch_key = None
+
+    def _send(self, topic, payload, qos):
+        """Publish a message; returns its mid while it waits for an ack"""
+        if not self.client.is_connected():
+            self._spill([(topic, payload, qos)])
+            return None
+        info = self.client.publish(topic, payload, qos=qos)
+        if info.rc != 0:
+            self._spill([(topic, payload, qos)])
+        elif qos == 0:
+            self.published += 1
+        else:
+            self.in_flight[info.mid] = (info, topic, payload, qos, monotonic())
+            return info.mid
+        return None
+
+    def _check_acks(self):
+        now = monotonic()
+        for mid, (info, topic, payload, qos, sent_at) in list(self.in_flight.items()):
+            if info.is_published():
+                self.published += 1
+            elif now - sent_at > self.ack_timeout:
+                self._spill([(topic, payload, qos)])
+            else:
+                continue
+            del self.in_flight[mid]
+            if self._replaying is not None:
+                self._replaying.discard(mid)
+        if self._replaying == set():
+            self._end_replay()
+
+    def _spill(self, messages):
+        if not messages:
+            return
+        with self._spill_lock:
+            with open(self.spill_path, "a") as spill_file:
+                for topic, payload, qos in messages:
+                    spill_file.write(
+                        json.dumps({"topic": topic, "payload": payload, "qos": qos})
+                        + "\n"
+                    )
+            self.spilled += len(messages)
+
+    def _replay_spill(self, closing=False):
+        """Re-send spilled messages on reconnect, once the queue has drained
+        and when closing; never while an earlier replay awaits its acks"""
+        connected = self.client.is_connected()
+        reconnected = connected and not self._connected
+        self._connected = connected
+        if not connected or self._replaying is not None:
+            return
+        drained = self.queue.empty() and monotonic() >= self._next_replay
+        if not (reconnected or drained or closing):
+            return
+        self._next_replay = monotonic() + self.REPLAY_INTERVAL
+
+        # Add new spills to a replay file left by an unfinished replay,
+        # e.g. of a run that crashed before its re-sent messages were acked
+        with self._spill_lock:
+            if os.path.exists(self.spill_path):
+                with open(self.spill_path) as spill_file:
+                    with open(self.replay_path, "a") as replay_file:
+                        replay_file.write(spill_file.read())
+                os.remove(self.spill_path)
+        if not os.path.exists(self.replay_path):
+            return
+        messages = []
+        with open(self.replay_path) as replay_file:
+            for line in replay_file:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    pass  # torn line from a crash while spilling
+
+        print(f"MQTT: re-sending {len(messages)} spilled messages")
+        self._replaying = set()
+        for message in messages:
+            mid = self._send(message["topic"], message["payload"], message["qos"])
+            if mid is not None:
+                self._replaying.add(mid)
+        self._check_acks()
+
+    def _end_replay(self):
+        # Every re-sent message is acknowledged or back in the spill file
+        if self._replaying is not None:
+            self._replaying = None
+            os.remove(self.replay_path)
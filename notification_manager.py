@@ -1,25 +1,84 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from twilio.rest import Client
 import json
 from datetime import datetime
-import pandas as pd
+import queue
+import threading
+from time import monotonic
 import traceback
 
+from clock import get_clock
+from utils.running_stats import RunningStats
+
 
 class NotificationManager:
-    def __init__(self, email_config, sms_config):
+    # Report title and (field, label, unit, decimals) per measurement type
+    MEASUREMENT_FIELDS = {
+        "am": (
+            "AM Modulation Measurements",
+            [("amValue", "AM Value", "%", 2), ("distortion", "Distortion", "%", 2)],
+        ),
+        "fm": (
+            "FM Modulation Measurements",
+            [("fmValue", "FM Value", " Hz", 2), ("distortion", "Distortion", "%", 2)],
+        ),
+        "level": (
+            "Level Measurements",
+            [("measured", "Level", " dBm", 2), ("uncertainty", "Uncertainty", " dB", 4)],
+        ),
+    }
+
+    def __init__(
+        self,
+        email_config,
+        sms_config,
+        keep_history=False,
+        quantiles=(),
+        journal=None,
+        clock=None,
+    ):
         self.email_config = email_config
         self.sms_config = sms_config
+        # Timestamps and report times; the error digest timing stays on
+        # real time since it paces actual emails
+        self.clock = clock or get_clock()
+        # Errors and warnings are also written to the run journal, if any
+        self.journal = journal
+        # Stations running in parallel threads share one manager
+        self._lock = threading.Lock()
+        # Errors are mailed from a background thread as digests: everything
+        # logged within error_digest_window seconds goes into one email, and
+        # at most one error email is sent per min_error_email_interval seconds
+        self.error_digest_window = email_config.get("error_digest_window", 30)
+        self.min_error_email_interval = email_config.get(
+            "min_error_email_interval", 120
+        )
+        self._error_queue = queue.Queue()
+        self._error_dispatcher = None
+        self._last_error_email = float("-inf")
+        # One lazily opened SMTP session reused for every email
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+        self.smtp_connections_opened = 0
+        self.emails_sent = 0
         self.summary_data = {
-            "start_time": datetime.now(),
+            "start_time": self.clock.now(),
             "total_measurements": 0,
             "errors": [],
             "warnings": [],
             "am_measurements": [],
+            "fm_measurements": [],
             "level_measurements": [],
         }
+        # Statistics are accumulated as results arrive; the raw results
+        # are only kept in summary_data when keep_history is set
+        self.keep_history = keep_history
+        self.quantiles = tuple(quantiles)
+        self.measurement_stats = {
+            measurement_type: {"all": self._new_stats(fields), "by_frequency": {}}
+            for measurement_type, (_, fields) in self.MEASUREMENT_FIELDS.items()
+        }
 
     # def send_email(self, subject, body):
     #     try:
@@ -50,38 +109,89 @@ class NotificationManager:
     #         print(f"Failed to send email notification: {e}")
     def send_email(self, subject, body):
         try:
-            # Connect to SMTP server
-            with smtplib.SMTP(
-                self.email_config["smtp_server"], self.email_config["smtp_port"]
-            ) as server:
-                server.starttls()
-                server.login(
-                    self.email_config["sender_email"],
-                    self.email_config["sender_password"],
-                )
-
-                # Create single message with all recipients in BCC
-                msg = MIMEMultipart()
-                msg["From"] = self.email_config["sender_email"]
-                msg["Subject"] = subject
-                # Use first recipient in To field and rest in BCC
-                msg["To"] = self.email_config["recipient_emails"][0]
-                if len(self.email_config["recipient_emails"]) > 1:
-                    msg["Bcc"] = ", ".join(self.email_config["recipient_emails"][1:])
-
-                # Add text body
-                msg.attach(MIMEText(body, "plain"))
-
-                # Send email to all recipients at once
-                server.send_message(msg)
+            # Create single message with all recipients in BCC
+            msg = MIMEMultipart()
+            msg["From"] = self.email_config["sender_email"]
+            msg["Subject"] = subject
+            # Use first recipient in To field and rest in BCC
+            msg["To"] = self.email_config["recipient_emails"][0]
+            if len(self.email_config["recipient_emails"]) > 1:
+                msg["Bcc"] = ", ".join(self.email_config["recipient_emails"][1:])
+
+            # Add text body
+            msg.attach(MIMEText(body, "plain"))
+
+            # Send email to all recipients at once over the shared session
+            with self._smtp_lock:
+                reused = self._smtp is not None
+                try:
+                    self._send_message(msg)
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    self._close_smtp()
+                    if not reused:
+                        raise
+                    # The pooled session went stale; reconnect once
+                    self._send_message(msg)
+                self.emails_sent += 1
 
             print(f"Email notification sent: {subject}")
         except Exception as e:
             print(f"Failed to send email notification: {str(e)}")
             traceback.print_exc()
 
+    def close(self):
+        """Flush pending error digests and close the SMTP session"""
+        self.flush_errors()
+        with self._smtp_lock:
+            self._close_smtp()
+        print(
+            f"SMTP: {self.smtp_connections_opened} connections opened, "
+            f"{self.emails_sent} emails sent"
+        )
+
+    def _send_message(self, msg):
+        if self._smtp is None:
+            self._smtp = self._connect_smtp()
+        try:
+            self._smtp.send_message(msg)
+        except smtplib.SMTPException:
+            self._close_smtp()
+            raise
+
+    def _connect_smtp(self):
+        # Connect to SMTP server
+        server = smtplib.SMTP(
+            self.email_config["smtp_server"],
+            self.email_config["smtp_port"],
+            timeout=self.email_config.get("smtp_timeout", 30),
+        )
+        try:
+            if self.email_config.get("use_tls", True):
+                server.starttls()
+            if self.email_config.get("sender_password"):
+                server.login(
+                    self.email_config["sender_email"],
+                    self.email_config["sender_password"],
+                )
+        except Exception:
+            server.close()
+            raise
+        self.smtp_connections_opened += 1
+        return server
+
+    def _close_smtp(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            self._smtp.close()
+        self._smtp = None
+
     def send_sms(self, message):
         try:
+            from twilio.rest import Client
+
             client = Client(
                 self.sms_config["twilio_account_sid"],
                 self.sms_config["twilio_auth_token"],
@@ -98,39 +208,129 @@ class NotificationManager:
             print(f"Failed to send SMS notification: {e}")
 
     def log_error(self, error_msg, stack_trace=None):
-        timestamp = datetime.now()
+        timestamp = self.clock.now()
         error_data = {
             "timestamp": timestamp,
             "message": error_msg,
             "stack_trace": stack_trace if stack_trace else traceback.format_exc(),
         }
-        self.summary_data["errors"].append(error_data)
-
-        # Send immediate notification for errors
-        subject = "❌ Calibration Error Alert"
-        body = f"""
+        with self._lock:
+            self.summary_data["errors"].append(error_data)
+            if self.journal:
+                self.journal.record_error(error_msg, timestamp)
+            if self._error_dispatcher is None:
+                self._error_dispatcher = threading.Thread(
+                    target=self._dispatch_errors, daemon=True
+                )
+                self._error_dispatcher.start()
+
+        # Notification is sent by the dispatcher thread
+        self._error_queue.put(error_data)
+
+    def flush_errors(self):
+        """Send any pending error digest now and stop the dispatcher"""
+        with self._lock:
+            dispatcher, self._error_dispatcher = self._error_dispatcher, None
+        if dispatcher:
+            self._error_queue.put(None)
+            dispatcher.join()
+
+    def _dispatch_errors(self):
+        while True:
+            error_data = self._error_queue.get()
+            if error_data is None:
+                return
+            pending = [error_data]
+
+            # Coalesce errors until the window closes and the rate limit allows
+            deadline = max(
+                monotonic() + self.error_digest_window,
+                self._last_error_email + self.min_error_email_interval,
+            )
+            stop = False
+            while not stop:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    error_data = self._error_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if error_data is None:
+                    stop = True
+                else:
+                    pending.append(error_data)
+
+            self._send_error_digest(pending)
+            self._last_error_email = monotonic()
+            if stop:
+                return
+
+    def _send_error_digest(self, errors):
+        if len(errors) == 1:
+            subject = "❌ Calibration Error Alert"
+            body = f"""
 Error detected in calibration process:
-Timestamp: {timestamp}
-Error: {error_msg}
-Stack Trace: {error_data['stack_trace']}
+Timestamp: {errors[0]['timestamp']}
+Error: {errors[0]['message']}
+Stack Trace: {errors[0]['stack_trace']}
         """
+        else:
+            subject = f"❌ Calibration Error Alert ({len(errors)} errors)"
+            body = f"{len(errors)} errors detected in calibration process:\n"
+            for error in errors:
+                body += f"""
+Timestamp: {error['timestamp']}
+Error: {error['message']}
+Stack Trace: {error['stack_trace']}
+"""
         self.send_email(subject, body)
-        # self.send_sms(f"Calibration Error: {error_msg}")
+        # self.send_sms(f"Calibration Error: {errors[-1]['message']}")
 
     def log_warning(self, warning_msg):
-        timestamp = datetime.now()
+        timestamp = self.clock.now()
         warning_data = {"timestamp": timestamp, "message": warning_msg}
-        self.summary_data["warnings"].append(warning_data)
+        with self._lock:
+            self.summary_data["warnings"].append(warning_data)
+            if self.journal:
+                self.journal.record_warning(warning_msg, timestamp)
+
+    def restore(self, journal_state):
+        """Restore the summary of an interrupted run from its journal"""
+        if journal_state["start_time"]:
+            self.summary_data["start_time"] = journal_state["start_time"]
+        for error in journal_state["errors"]:
+            self.summary_data["errors"].append({**error, "stack_trace": ""})
+        self.summary_data["warnings"].extend(journal_state["warnings"])
+        for measurement_type, result in journal_state["results"]:
+            self.log_measurement(result, measurement_type)
 
     def log_measurement(self, measurement_data, measurement_type):
-        self.summary_data["total_measurements"] += 1
-        if measurement_type == "am":
-            self.summary_data["am_measurements"].append(measurement_data)
-        else:
-            self.summary_data["level_measurements"].append(measurement_data)
+        if measurement_type not in self.MEASUREMENT_FIELDS:
+            measurement_type = "level"
+        _, fields = self.MEASUREMENT_FIELDS[measurement_type]
+
+        with self._lock:
+            self.summary_data["total_measurements"] += 1
+            if self.keep_history:
+                self.summary_data[f"{measurement_type}_measurements"].append(
+                    measurement_data
+                )
+
+            stats = self.measurement_stats[measurement_type]
+            by_frequency = stats["by_frequency"].setdefault(
+                measurement_data["frequency"], self._new_stats(fields)
+            )
+            for field, _, _, _ in fields:
+                value = float(measurement_data[field])
+                stats["all"][field].add(value)
+                by_frequency[field].add(value)
+
+    def _new_stats(self, fields):
+        return {field: RunningStats(self.quantiles) for field, _, _, _ in fields}
 
     def generate_summary_report(self):
-        end_time = datetime.now()
+        end_time = self.clock.now()
         duration = end_time - self.summary_data["start_time"]
 
         # Create summary report
@@ -176,30 +376,47 @@ Measurement Statistics:
     def _generate_measurement_stats(self):
         stats = ""
 
-        # AM Modulation Statistics
-        if self.summary_data["am_measurements"]:
-            am_df = pd.DataFrame(self.summary_data["am_measurements"])
-            stats += "\nAM Modulation Measurements:\n"
-            stats += f"Total Points: {len(am_df)}\n"
-            stats += f"Average AM Value: {am_df['amValue'].mean():.2f}%\n"
-            stats += f"Average Distortion: {am_df['distortion'].mean():.2f}%\n"
-
-        # Level Measurement Statistics
-        if self.summary_data["level_measurements"]:
-            level_df = pd.DataFrame(self.summary_data["level_measurements"])
-            stats += "\nLevel Measurements:\n"
-            stats += f"Total Points: {len(level_df)}\n"
-            stats += f"Average Level: {level_df['measured'].mean():.2f} dBm\n"
-            stats += f"Average Uncertainty: {level_df['uncertainty'].mean():.4f} dB\n"
+        for measurement_type, (title, fields) in self.MEASUREMENT_FIELDS.items():
+            type_stats = self.measurement_stats[measurement_type]
+            count = type_stats["all"][fields[0][0]].count
+            if not count:
+                continue
+
+            stats += f"\n{title}:\n"
+            stats += f"Total Points: {count}\n"
+            for field, label, unit, decimals in fields:
+                field_stats = type_stats["all"][field]
+                stats += (
+                    f"Average {label}: {field_stats.mean:.{decimals}f}{unit} "
+                    f"(std {field_stats.std:.{decimals}f}, "
+                    f"min {field_stats.min:.{decimals}f}, "
+                    f"max {field_stats.max:.{decimals}f}"
+                )
+                for p in self.quantiles:
+                    stats += f", p{p * 100:g} {field_stats.quantile(p):.{decimals}f}"
+                stats += ")\n"
+
+            stats += "Per Frequency:\n"
+            for frequency, frequency_stats in type_stats["by_frequency"].items():
+                averages = ", ".join(
+                    f"{label} {frequency_stats[field].mean:.{decimals}f}{unit}"
+                    for field, label, unit, decimals in fields
+                )
+                stats += (
+                    f"- {frequency}: {frequency_stats[fields[0][0]].count} points, "
+                    f"{averages}\n"
+                )
 
         return stats
 
     def send_completion_notification(self):
+        self.flush_errors()
         report = self.generate_summary_report()
 
         # Send email with detailed report
         subject = "✅ Calibration Process Complete"
         self.send_email(subject, report)
+        self.close()
 
         # Send SMS with brief summary
         # sms_message = (
@@ -0,0 +1,274 @@
+import csv
+import json
+import os
+
+# Output file name per measurement type (without extension)
+RESULT_FILES = {
+    "am": "AM_MOD_Results",
+    "level": "LEVEL_Results",
+    "fm": "FM_MOD_Results",
+}
+
+# (header, result key, NumPy dtype) for each output column; the widths of
+# the string columns are minimums, the binary format widens them to fit
+RESULT_COLUMNS = {
+    "am": [
+        ("Frequency", "frequency", "U16"),
+        ("AM Modulation (%)", "amValue", "f8"),
+        ("Distortion (%)", "distortion", "f8"),
+        ("Timestamp", "timestamp", "U8"),
+    ],
+    "level": [
+        ("Frequency", "frequency", "U16"),
+        ("Measured", "measured", "f8"),
+        ("Uncertainty", "uncertainty", "f8"),
+        ("Timestamp", "timestamp", "U8"),
+    ],
+    "fm": [
+        ("Frequency", "frequency", "U16"),
+        ("FM Modulation (Hz)", "fmValue", "f8"),
+        ("Distortion (%)", "distortion", "f8"),
+        ("Timestamp", "timestamp", "U8"),
+    ],
+}
+
+STATION_COLUMN = ("Station", "station", "U32")
+
+# Output formats ResultSink can write
+RESULT_FORMATS = ("csv", "binary", "parquet")
+
+
+class ResultSink:
+    """Buffered writer for the AM, FM and level result files
+
+    Rows are buffered and written in groups: on commit(), or automatically
+    every commit_every rows. Each group is written to every requested format:
+    "csv" (the .txt result files), "binary" (raw NumPy records, see
+    load_binary_results) and "parquet" (one row group per commit, needs
+    pyarrow). With durable=True every commit is fsync'ed to disk. With
+    append=True existing result files are extended instead of replaced, as
+    when resuming an interrupted run.
+    """
+
+    def __init__(
+        self,
+        prefix="./",
+        formats=("csv",),
+        commit_every=None,
+        durable=False,
+        extra_columns=(),
+        append=False,
+    ):
+        unknown = [name for name in formats if name not in RESULT_FORMATS]
+        if unknown:
+            raise ValueError(
+                f"Unknown result format(s) {', '.join(unknown)}; "
+                f"choose from {', '.join(RESULT_FORMATS)}"
+            )
+        self.commit_every = commit_every
+        self.durable = durable
+        self.rows_written = 0
+        self._pending = {measurement_type: [] for measurement_type in RESULT_FILES}
+        self._writers = {measurement_type: [] for measurement_type in RESULT_FILES}
+
+        writer_classes = {
+            "csv": _CsvWriter,
+            "binary": _BinaryWriter,
+            "parquet": _ParquetWriter,
+        }
+        for measurement_type, name in RESULT_FILES.items():
+            columns = list(extra_columns) + RESULT_COLUMNS[measurement_type]
+            for output_format in formats:
+                self._writers[measurement_type].append(
+                    writer_classes[output_format](
+                        f"{prefix}{name}", columns, append
+                    )
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, measurement_type, results):
+        """Queue results (records or dicts) of one measurement type"""
+        self._pending[measurement_type].extend(results)
+        if self.commit_every and self.pending_rows() >= self.commit_every:
+            self.commit()
+
+    def pending_rows(self):
+        return sum(len(rows) for rows in self._pending.values())
+
+    def commit(self):
+        """Write all buffered rows and flush them (fsync if durable)"""
+        for measurement_type, rows in self._pending.items():
+            if not rows:
+                continue
+            for writer in self._writers[measurement_type]:
+                writer.write_rows(rows)
+                writer.flush(self.durable)
+            self.rows_written += len(rows)
+            self._pending[measurement_type] = []
+
+    def close(self):
+        self.commit()
+        for writers in self._writers.values():
+            for writer in writers:
+                writer.close()
+
+
+class _CsvWriter:
+    def __init__(self, base_path, columns, append=False):
+        self.keys = [key for _, key, _ in columns]
+        self.file = open(f"{base_path}.txt", "a" if append else "w", newline="")
+        self.writer = csv.writer(self.file, lineterminator="\n")
+        if self.file.tell() == 0:
+            self.writer.writerow([header for header, _, _ in columns])
+
+    def write_rows(self, rows):
+        self.writer.writerows([row[key] for key in self.keys] for row in rows)
+
+    def flush(self, durable):
+        self.file.flush()
+        if durable:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class _BinaryWriter:
+    """Appends NumPy structured records; the dtype is stored next to the data
+
+    A string longer than its column widens the column: the records written
+    so far are rewritten with the wider dtype, so nothing is truncated.
+    """
+
+    def __init__(self, base_path, columns, append=False):
+        import numpy as np
+
+        self.np = np
+        self.path = f"{base_path}.bin"
+        self.dtype_path = f"{base_path}.dtype.json"
+        self.keys = [key for _, key, _ in columns]
+        self.dtype = np.dtype([(key, dtype) for _, key, dtype in columns])
+        self.strings = [
+            index for index, key in enumerate(self.keys) if self.dtype[key].kind == "U"
+        ]
+        widths = {key: self.dtype[key].itemsize // 4 for key in self.keys}
+        self.file = open(self.path, "ab" if append else "wb")
+        if self.file.tell():
+            # Extend the existing records, widened to the columns asked for
+            self.dtype = _load_dtype(self.dtype_path)
+            self._widen(widths)
+        else:
+            self._write_dtype()
+
+    def write_rows(self, rows):
+        values = [tuple(row[key] for key in self.keys) for row in rows]
+        self._widen(
+            {
+                self.keys[index]: max(len(str(value[index])) for value in values)
+                for index in self.strings
+            }
+        )
+        self.np.array(values, dtype=self.dtype).tofile(self.file)
+
+    def _widen(self, widths):
+        """Make string columns at least widths[key] characters wide"""
+        fields = []
+        for key in self.keys:
+            field = self.dtype[key]
+            if field.kind == "U" and widths.get(key, 0) > field.itemsize // 4:
+                field = self.np.dtype(f"U{widths[key]}")
+            fields.append((key, field))
+        dtype = self.np.dtype(fields)
+        if dtype == self.dtype:
+            return
+
+        self.file.flush()
+        records = self.np.fromfile(self.path, dtype=self.dtype).astype(dtype)
+        self.file.close()
+        with open(f"{self.path}.tmp", "wb") as tmp_file:
+            records.tofile(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(f"{self.path}.tmp", self.path)
+        self.dtype = dtype
+        self._write_dtype()
+        self.file = open(self.path, "ab")
+
+    def _write_dtype(self):
+        with open(self.dtype_path, "w") as dtype_file:
+            json.dump(self.dtype.descr, dtype_file)
+
+    def flush(self, durable):
+        self.file.flush()
+        if durable:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    """Parquet files cannot be extended, so appending starts a numbered part"""
+
+    def __init__(self, base_path, columns, append=False):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.keys = [key for _, key, _ in columns]
+        self.schema = pa.schema(
+            [
+                (key, pa.float64() if dtype.startswith("f") else pa.string())
+                for _, key, dtype in columns
+            ]
+        )
+        path = f"{base_path}.parquet"
+        part = 0
+        while append and os.path.exists(path):
+            part += 1
+            path = f"{base_path}.{part}.parquet"
+        self.file = open(path, "wb")
+        self.writer = pq.ParquetWriter(self.file, self.schema)
+
+    def write_rows(self, rows):
+        table = self.pa.Table.from_pydict(
+            {key: [row[key] for row in rows] for key in self.keys}, schema=self.schema
+        )
+        self.writer.write_table(table)
+
+    def flush(self, durable):
+        self.file.flush()
+        if durable:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.writer.close()
+        self.file.close()
+
+
+def load_binary_results(base_path, mmap=True):
+    """Load records written with the "binary" format as a NumPy structured array
+
+    With mmap=True the file is memory-mapped, so millions of points are
+    available without reading them all into memory first.
+    """
+    import numpy as np
+
+    dtype = _load_dtype(f"{base_path}.dtype.json")
+    if mmap:
+        if os.path.getsize(f"{base_path}.bin") == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(f"{base_path}.bin", dtype=dtype, mode="r")
+    return np.fromfile(f"{base_path}.bin", dtype=dtype)
+
+
+def _load_dtype(path):
+    import numpy as np
+
+    with open(path) as dtype_file:
+        return np.dtype([tuple(field) for field in json.load(dtype_file)])
@@ -0,0 +1,169 @@
+"""Typed result records for the AM, FM and level readings
+
+A reading is a slotted dataclass instead of a dict: the frequency as
+configured plus in Hz, the swept point, the rounded readings and two
+timestamps in nanoseconds, monotonic (for intervals) and wall clock.
+record["amValue"], record["timestamp"] etc. still work with the keys of
+the old result dicts, so the result files, the journal and the reports
+read records and dicts alike; to_dict() gives the old dict (MQTT payloads).
+to_array() turns records into a NumPy structured array for statistics.
+"""
+from dataclasses import dataclass
+from operator import attrgetter
+import time
+from typing import Optional
+
+
+class _Result:
+    __slots__ = ()
+
+    # Result "type" value, and (old dict key, attribute) of the point and readings
+    TYPE = None
+    KEYS = ()
+    # Minimum width of the point column in to_array(); longer points widen it
+    POINT_WIDTH = 16
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ATTRIBUTES = dict(cls.KEYS)
+        cls._ROW = attrgetter(
+            "frequency_hz",
+            *(attribute for _, attribute in cls.KEYS),
+            "monotonic_ns",
+            "wall_ns",
+        )
+
+    @property
+    def timestamp(self):
+        """Wall-clock time of the reading as HH:MM:SS"""
+        return time.strftime("%H:%M:%S", time.localtime(self.wall_ns // 1_000_000_000))
+
+    def __getitem__(self, key):
+        if key == "type":
+            return self.TYPE
+        if key == "timestamp":
+            return self.timestamp
+        attribute = self._ATTRIBUTES.get(key, key)
+        if attribute not in self.__dataclass_fields__:
+            raise KeyError(key)
+        return getattr(self, attribute)
+
+    def to_dict(self):
+        """The result as the dict the perform_* functions used to return"""
+        data = {"type": self.TYPE, "frequency": self.frequency}
+        for key, attribute in self.KEYS:
+            data[key] = getattr(self, attribute)
+        if getattr(self, "sinad", None) is not None:
+            data["sinad"] = self.sinad
+        data["timestamp"] = self.timestamp
+        if self.station:
+            data["station"] = self.station
+        return data
+
+    @classmethod
+    def dtype(cls, point_width=None):
+        """NumPy structured dtype of to_array() for this record type"""
+        import numpy as np
+
+        point_width = max(point_width or 0, cls.POINT_WIDTH)
+        columns = [("frequency_hz", "f8"), (cls.KEYS[0][1], f"U{point_width}")]
+        columns += [(attribute, "f8") for _, attribute in cls.KEYS[1:]]
+        columns += [("monotonic_ns", "i8"), ("wall_ns", "i8")]
+        return np.dtype(columns)
+
+    def as_row(self):
+        """Values in the column order of dtype()"""
+        return self._ROW(self)
+
+
+@dataclass(slots=True)
+class AmResult(_Result):
+    """One AM modulation reading"""
+
+    frequency: str
+    frequency_hz: float
+    mod_depth: str
+    am_value: float
+    distortion: float
+    monotonic_ns: int
+    wall_ns: int
+    sinad: Optional[float] = None
+    station: str = ""
+
+    TYPE = "am_modulation"
+    KEYS = (
+        ("modDepth", "mod_depth"),
+        ("amValue", "am_value"),
+        ("distortion", "distortion"),
+    )
+
+
+@dataclass(slots=True)
+class FmResult(_Result):
+    """One FM modulation reading"""
+
+    frequency: str
+    frequency_hz: float
+    deviation: str
+    fm_value: float
+    distortion: float
+    monotonic_ns: int
+    wall_ns: int
+    sinad: Optional[float] = None
+    station: str = ""
+
+    TYPE = "fm_modulation"
+    KEYS = (
+        ("mod_Deviation", "deviation"),
+        ("fmValue", "fm_value"),
+        ("distortion", "distortion"),
+    )
+
+
+@dataclass(slots=True)
+class LevelResult(_Result):
+    """One level reading"""
+
+    frequency: str
+    frequency_hz: float
+    level: str
+    measured: float
+    uncertainty: float
+    monotonic_ns: int
+    wall_ns: int
+    station: str = ""
+
+    TYPE = "level_measurement"
+    KEYS = (
+        ("level", "level"),
+        ("measured", "measured"),
+        ("uncertainty", "uncertainty"),
+    )
+
+
+def result_dict(result):
+    """Plain dict of a result record; dicts are returned unchanged"""
+    return result.to_dict() if isinstance(result, _Result) else result
+
+
+def timestamps(clock):
+    """(monotonic_ns, wall_ns) of clock's current time"""
+    return int(clock.monotonic() * 1e9), int(clock.now().timestamp() * 1e9)
+
+
+def to_array(records, record_class=None):
+    """Structured NumPy array of records of one type
+
+    Columns are frequency_hz, the point, the readings and both timestamps.
+    Building the array copies the records once; array["am_value"] etc. are
+    views on that copy, so statistics on them copy nothing more. record_class
+    gives the dtype when records may be empty.
+    """
+    import numpy as np
+
+    records = list(records)
+    record_class = record_class or type(records[0])
+    # Size the point column to the longest point so nothing is truncated
+    points = map(attrgetter(record_class.KEYS[0][1]), records)
+    dtype = record_class.dtype(max(map(len, points), default=0))
+    return np.fromiter(map(record_class._ROW, records), dtype=dtype, count=len(records))
@@ -0,0 +1,153 @@
+from datetime import datetime
+import json
+import os
+import threading
+
+from results import result_dict
+
+# Result key and plan point key identifying a measurement point per type
+POINT_KEYS = {
+    "am": ("modDepth", "depth"),
+    "fm": ("mod_Deviation", "dev"),
+    "level": ("level", "level"),
+}
+
+
+class RunJournal:
+    """Append-only JSON-lines journal of a calibration run
+
+    Every completed measurement point is appended and fsync'ed before the
+    run moves on, so an interrupted run can be resumed with load_journal()
+    and remove_completed(). A torn last line from a crash is ignored, and
+    a resumed journal starts on a new line after it.
+
+    Points are journaled after their rows are committed to the result
+    files. A crash between the two leaves rows the journal does not know
+    about: the resumed run measures that step again, and the result files
+    hold both readings of its points, the repeated one last.
+    """
+
+    def __init__(self, path="./calibration_journal.jsonl", resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.file = open(path, "a" if resume else "w")
+        if resume and self.file.tell():
+            with open(path, "rb") as journal_file:
+                journal_file.seek(-1, os.SEEK_END)
+                torn = journal_file.read(1) != b"\n"
+            if torn:
+                # End the line the crash tore, so the next entry is whole
+                self.file.write("\n")
+        if not resume:
+            self._append([{"event": "start", "start_time": _now()}])
+
+    def record_results(self, measurement_type, freq, results):
+        result_key, _ = POINT_KEYS[measurement_type]
+        self._append(
+            [
+                {
+                    "event": "point",
+                    "type": measurement_type,
+                    "frequency": freq["display"],
+                    "point": result[result_key],
+                    "result": result_dict(result),
+                }
+                for result in results
+            ]
+        )
+
+    def record_error(self, message, timestamp):
+        self._append(
+            [{"event": "error", "message": message, "timestamp": timestamp.isoformat()}]
+        )
+
+    def record_warning(self, message, timestamp):
+        self._append(
+            [
+                {
+                    "event": "warning",
+                    "message": message,
+                    "timestamp": timestamp.isoformat(),
+                }
+            ]
+        )
+
+    def record_complete(self):
+        self._append([{"event": "complete", "end_time": _now()}])
+
+    def close(self):
+        self.file.close()
+
+    def _append(self, entries):
+        with self._lock:
+            self.file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+
+def load_journal(path="./calibration_journal.jsonl"):
+    """Read a journal back into the state needed to resume the run"""
+    state = {
+        "start_time": None,
+        "completed": set(),
+        "results": [],
+        "errors": [],
+        "warnings": [],
+        "complete": False,
+    }
+    if not os.path.exists(path):
+        return state
+
+    with open(path) as journal_file:
+        for line in journal_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn write at the moment of the crash
+
+            event = entry["event"]
+            if event == "start":
+                state["start_time"] = datetime.fromisoformat(entry["start_time"])
+            elif event == "point":
+                state["completed"].add(
+                    (entry["type"], entry["frequency"], entry["point"])
+                )
+                state["results"].append((entry["type"], entry["result"]))
+            elif event in ("error", "warning"):
+                state[f"{event}s"].append(
+                    {
+                        "timestamp": datetime.fromisoformat(entry["timestamp"]),
+                        "message": entry["message"],
+                    }
+                )
+            elif event == "complete":
+                state["complete"] = True
+    return state
+
+
+def remove_completed(plan, completed):
+    """Drop the measurement points of an execution plan that are already done"""
+    remaining = []
+    for step in plan:
+        measurement_type = step["action"]
+        if measurement_type in POINT_KEYS:
+            _, point_key = POINT_KEYS[measurement_type]
+            points = [
+                point
+                for point in step["points"]
+                if (measurement_type, step["freq"]["display"], point[point_key])
+                not in completed
+            ]
+            if not points:
+                continue
+            step = {**step, "points": points}
+        remaining.append(step)
+
+    # The power-meter zero is only needed if level steps are left
+    if not any(step["action"] == "level" for step in remaining):
+        remaining = [step for step in remaining if step["action"] != "zero_power_meter"]
+    return remaining
+
+
+def _now():
+    return datetime.now().isoformat()
@@ -0,0 +1,167 @@
+from instrument_utils import reset_instruments
+from instrumentation import span
+from am_modulation import AM_MEASUREMENT, perform_am_trace_measurements
+from fm_modulation import FM_MEASUREMENT, perform_fm_trace_measurements
+from level_measurement import LEVEL_MEASUREMENT, setup_power_meter
+from measurement_plan import compile_setup, perform_measurements, run_setup
+
+# Plan orders
+FREQUENCY_MAJOR = "frequency_major"  # reset + AM/FM/level for every frequency
+PHASE_MAJOR = "phase_major"  # all AM/FM points, then all level points with one zero
+SHARED_TUNING = "shared_tuning"  # AM, FM and level at each frequency, tuned once
+
+# Plan action -> measurement type
+MEASUREMENTS = {"am": AM_MEASUREMENT, "fm": FM_MEASUREMENT, "level": LEVEL_MEASUREMENT}
+# Trace-based variants used with execute_plan(trace=True)
+TRACE_MEASUREMENTS = {
+    "am": perform_am_trace_measurements,
+    "fm": perform_fm_trace_measurements,
+}
+
+
+def build_execution_plan(
+    freq_points, mod_depths, level_points, order=PHASE_MAJOR, mod_devs=()
+):
+    """Build the ordered list of steps for a calibration run
+
+    Each step is a dict with an "action" key ("reset", "zero_power_meter",
+    "am", "fm" or "level"); measurement steps also carry the frequency point
+    and the measurement points to run there. FREQUENCY_MAJOR resets before
+    every measurement step; PHASE_MAJOR and SHARED_TUNING rely on
+    execute_plan sending only the setup commands that change something.
+    """
+    plan = []
+    modulations = [("am", mod_depths), ("fm", mod_devs)]
+
+    def level_step(freq, zero_power_meter):
+        return {
+            "action": "level",
+            "freq": freq,
+            "points": level_points,
+            "zero_power_meter": zero_power_meter,
+        }
+
+    if order == FREQUENCY_MAJOR:
+        for freq in freq_points:
+            for action, points in modulations:
+                if points:
+                    plan.append({"action": "reset"})
+                    plan.append({"action": action, "freq": freq, "points": points})
+            if level_points:
+                plan.append({"action": "reset"})
+                plan.append(level_step(freq, True))
+    elif order == PHASE_MAJOR:
+        if mod_depths or mod_devs:
+            plan.append({"action": "reset"})
+            for action, points in modulations:
+                if points:
+                    for freq in freq_points:
+                        plan.append({"action": action, "freq": freq, "points": points})
+        if level_points:
+            plan.append({"action": "reset"})
+            plan.append({"action": "zero_power_meter"})
+            for freq in freq_points:
+                plan.append(level_step(freq, False))
+    elif order == SHARED_TUNING:
+        plan.append({"action": "reset"})
+        if level_points:
+            plan.append({"action": "zero_power_meter"})
+        for freq in freq_points:
+            for action, points in modulations:
+                if points:
+                    plan.append({"action": action, "freq": freq, "points": points})
+            if level_points:
+                plan.append(level_step(freq, False))
+    else:
+        raise ValueError(f"Unknown plan order: {order}")
+
+    return plan
+
+
+def execute_plan(
+    plan,
+    FSMR_STD,
+    SigGen_UUC,
+    mqtt_client,
+    notification_manager,
+    on_results,
+    adaptive=False,
+    trace=False,
+):
+    """Run the steps of an execution plan
+
+    on_results(measurement_type, freq, results) is called after each
+    measurement step. A failing step is reported and the plan continues.
+    The setup of a measurement step is compiled against the settings the
+    previous steps left behind (see measurement_plan.compile_setup); a
+    reset or a failure makes them unknown again. With adaptive=True
+    readings are taken as soon as they settle instead of after the fixed
+    point delays. With trace=True the AM and FM points of a step are
+    analyzed from captures of the demodulated trace instead of the marker
+    results.
+    """
+    settings = {}
+    for step in plan:
+        action = step["action"]
+        freq = step.get("freq")
+
+        try:
+            with span(action, freq=freq["display"] if freq else None):
+                if action == "reset":
+                    settings.clear()
+                    reset_instruments(FSMR_STD, SigGen_UUC)
+
+                elif action == "zero_power_meter":
+                    print("\nZeroing power meter...")
+                    setup_power_meter(FSMR_STD, settings)
+
+                elif action in MEASUREMENTS:
+                    measurement = MEASUREMENTS[action]
+                    print(
+                        f"\nPerforming {measurement['title']} measurements at "
+                        f"{freq['display']}..."
+                    )
+                    if step.get("zero_power_meter"):
+                        setup_power_meter(FSMR_STD, settings)
+                    run_setup(
+                        FSMR_STD,
+                        SigGen_UUC,
+                        compile_setup(
+                            measurement, freq["display"], freq["value"], settings
+                        ),
+                    )
+                    if trace and action in TRACE_MEASUREMENTS:
+                        results = TRACE_MEASUREMENTS[action](
+                            FSMR_STD,
+                            SigGen_UUC,
+                            freq["display"],
+                            freq["value"],
+                            step["points"],
+                            mqtt_client,
+                            settings=settings,
+                        )
+                    else:
+                        results = perform_measurements(
+                            measurement,
+                            FSMR_STD,
+                            SigGen_UUC,
+                            freq["display"],
+                            freq["value"],
+                            step["points"],
+                            mqtt_client,
+                            adaptive=adaptive,
+                            settings=settings,
+                        )
+                    on_results(action, freq, results)
+
+                else:
+                    raise ValueError(f"Unknown plan action: {action}")
+
+        except Exception as e:
+            settings.clear()
+            if freq:
+                error_msg = f"Error processing frequency {freq['display']}: {str(e)}"
+            else:
+                error_msg = f"Error during {action} step: {str(e)}"
+            notification_manager.log_error(error_msg)
+            continue
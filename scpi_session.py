@@ -0,0 +1,309 @@
+from contextlib import contextmanager, nullcontext
+import re
+import threading
+
+# Longest compound message sent in one write, kept well inside the input
+# buffer of the R&S instruments
+MAX_MESSAGE_LENGTH = 512
+
+# Commands that start an operation rather than set a value
+ACTION_HEADERS = ("CAL", "CORR:COLL", "INIT", "ABOR")
+
+
+class StateCachingSession:
+    """Instrument session wrapper that skips writes which would not change the instrument state"""
+
+    # Commands after which the cached settings no longer describe the instrument
+    RESET_HEADERS = ("*RST", "*RCL", "SYST:PRES", "INST", "INST:SEL")
+
+    def __init__(self, instrument, name="instrument"):
+        self.instrument = instrument
+        self.name = name
+        self.settings = {}
+        # Both count sub-commands, however many go into one message
+        self.writes_sent = 0
+        self.writes_saved = 0
+
+    def __getattr__(self, attribute):
+        return getattr(self.instrument, attribute)
+
+    def write_str(self, command):
+        self._write(self.instrument.write_str, command)
+
+    def write(self, command):
+        self._write(self.instrument.write, command)
+
+    def query_str(self, query):
+        return self._query(self.instrument.query_str, query)
+
+    def query_float(self, query):
+        return self._query(self.instrument.query_float, query)
+
+    def query_bin_block(self, query):
+        return self._query(self.instrument.query_bin_block, query)
+
+    def query_opc(self, timeout=0):
+        return self._query(self.instrument.query_opc, timeout)
+
+    def invalidate(self):
+        """Forget all cached settings"""
+        self.settings.clear()
+
+    def report(self):
+        return (
+            f"{self.name}: {self.writes_sent} SCPI commands sent, "
+            f"{self.writes_saved} redundant commands suppressed"
+        )
+
+    def _write(self, send, command):
+        commands = split_commands(command)
+        pending = []
+        for sub_command in commands:
+            header, value = split_command(sub_command)
+            if self._is_cacheable(header) and self.settings.get(header) == value:
+                self.writes_saved += 1
+            else:
+                pending.append((sub_command, header, value))
+        if not pending:
+            return
+
+        if len(pending) == len(commands):
+            message = command
+        else:
+            message = join_commands([sub_command for sub_command, _, _ in pending])
+        try:
+            send(message)
+        except Exception:
+            self.invalidate()
+            raise
+        self.writes_sent += len(pending)
+
+        for _, header, value in pending:
+            if header in self.RESET_HEADERS:
+                self.invalidate()
+            if self._is_cacheable(header):
+                self.settings[header] = value
+
+    def _query(self, send, query):
+        try:
+            return send(query)
+        except Exception:
+            self.invalidate()
+            raise
+
+    def _is_cacheable(self, header):
+        # Actions are never suppressed
+        return not is_action(header)
+
+
+class SharedSession:
+    """Instrument session shared between threads
+
+    Every call holds the session lock, so the measurement loop and the
+    health monitor never interleave their I/O. transaction() keeps the lock
+    over several calls; another thread can get in only between them.
+    """
+
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.lock = threading.RLock()
+
+    def __getattr__(self, attribute):
+        return getattr(self.instrument, attribute)
+
+    def write_str(self, command):
+        with self.lock:
+            return self.instrument.write_str(command)
+
+    def write(self, command):
+        with self.lock:
+            return self.instrument.write(command)
+
+    def query_str(self, query):
+        with self.lock:
+            return self.instrument.query_str(query)
+
+    def query_float(self, query):
+        with self.lock:
+            return self.instrument.query_float(query)
+
+    def query_bin_block(self, query):
+        with self.lock:
+            return self.instrument.query_bin_block(query)
+
+    def query_opc(self, timeout=0):
+        with self.lock:
+            return self.instrument.query_opc(timeout)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            yield self
+
+
+def transaction(instrument):
+    """Hold a SharedSession for the with-block; a no-op for other sessions"""
+    hold = getattr(instrument, "transaction", None)
+    return hold() if hold else nullcontext()
+
+
+class BatchError(Exception):
+    """A compound message failed
+
+    command is the sub-command the instrument blamed and position its index
+    in the batch; when the error names no sub-command (a timeout, say)
+    command is the whole compound message and position None.
+    """
+
+    def __init__(self, command, error, position=None):
+        super().__init__(f"Batched command {command!r} failed: {error}")
+        self.command = command
+        self.error = error
+        self.position = position
+
+    @classmethod
+    def locate(cls, commands, error, offset=0):
+        """BatchError for a compound message of commands that raised error
+
+        R&S instruments end an error queue entry with the command that
+        caused it (-222,"Data out of range;INP:ATT 99"), and RsInstrument
+        with instrument_status_checking puts the entries into the exception
+        text. Nothing is sent again to find the command: replaying a batch
+        would repeat actions such as CAL:PMET:ZERO or CORR:COLL, and after a
+        timeout the message may well have run.
+        """
+        for context in re.findall(r';([^;"]+)"', str(error)):
+            blamed = split_command(context)
+            for index, command in enumerate(commands):
+                if split_command(command) == blamed:
+                    return cls(command, error, offset + index)
+        return cls(join_commands(commands), error)
+
+
+class CommandBatch:
+    """Queues writes and sends them as few compound messages as possible"""
+
+    def __init__(self, instrument, max_length=MAX_MESSAGE_LENGTH):
+        self.instrument = instrument
+        self.max_length = max_length
+        self.commands = []
+
+    def write_str(self, command):
+        self.commands.extend(split_commands(command))
+
+    def write(self, command):
+        self.write_str(command)
+
+    def flush(self):
+        """Send the queued commands; raises BatchError naming the failing one"""
+        commands, self.commands = self.commands, []
+        offset = 0
+        for group in group_commands(commands, self.max_length):
+            try:
+                # With instrument_status_checking the error queue is read
+                # once here instead of after every sub-command
+                self.instrument.write_str(join_commands(group))
+            except Exception as e:
+                raise BatchError.locate(group, e, offset) from e
+            offset += len(group)
+
+
+@contextmanager
+def batch(instrument, max_length=MAX_MESSAGE_LENGTH):
+    """Collect writes in the with-block and send them as compound messages
+
+        with batch(FSMR_STD) as fsmr:
+            fsmr.write_str("FILT:HPAS ON")
+            fsmr.write_str("FILT:LPAS ON")
+    """
+    commands = CommandBatch(instrument, max_length)
+    yield commands
+    commands.flush()
+
+
+def query_values(instrument, queries, types=None):
+    """Send several queries as one compound message and return typed answers
+
+        am_value, dist_value = query_values(
+            FSMR_STD, ["CALC:MARK:FUNC:ADEM:AM? PAV", "CALC:MARK:FUNC:ADEM:DIST:RES?"]
+        )
+
+    types lists one converter per query and defaults to float.
+    """
+    response = instrument.query_str(join_commands(queries))
+    return parse_values(response, len(queries), types)
+
+
+def parse_values(response, count, types=None):
+    """Parse a comma- or semicolon-separated response into count typed values"""
+    fields = [field.strip() for field in re.split(r"[;,]", response.strip())]
+    if len(fields) != count:
+        raise ValueError(f"Expected {count} values, got {response!r}")
+    types = types or [float] * count
+    return [convert(field) for convert, field in zip(types, fields)]
+
+
+def split_commands(message):
+    """Split a compound SCPI message at the semicolons outside of quotes"""
+    commands = []
+    current = []
+    quote = None
+    for char in message:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == ";":
+            commands.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    commands.append("".join(current).strip())
+    return [command for command in commands if command]
+
+
+def group_commands(commands, max_length=MAX_MESSAGE_LENGTH):
+    """Split commands into runs that each fit one compound message"""
+    group = []
+    for command in commands:
+        if group and len(join_commands(group + [command])) > max_length:
+            yield group
+            group = []
+        group.append(command)
+    if group:
+        yield group
+
+
+def join_commands(commands):
+    """Join SCPI commands into one message, each starting from the root node"""
+    message = ""
+    for command in commands:
+        if message:
+            message += ";" if command.startswith((":", "*")) else ";:"
+        message += command
+    return message
+
+
+def is_action(header):
+    """True for common commands (*...) and the ACTION_HEADERS
+
+    Matches whole header nodes, so CAL:PMET:ZERO is an action and
+    CALC2:FEED a setting.
+    """
+    if header.startswith("*"):
+        return True
+    return any(
+        header == action or header.startswith(action + ":")
+        for action in ACTION_HEADERS
+    )
+
+
+def split_command(command):
+    """Split a SCPI command into its normalized header and argument string"""
+    parts = command.strip().split(None, 1)
+    if not parts:
+        return "", ""
+    header = parts[0].lstrip(":").upper()
+    value = " ".join(parts[1].split()) if len(parts) > 1 else ""
+    return header, value
@@ -0,0 +1,500 @@
+"""Simulated FSMR and signal generator for dry runs and benchmarks
+
+Both instruments parse SCPI (long or short form, compound messages, optional
+nodes) and share a SimulatedBench: what the generator outputs is what the
+analyzer measures, including a settling transient after every change. The
+real setup_* and perform_* functions run against them unchanged.
+"""
+import math
+import random
+import re
+from clock import get_clock
+from scpi_session import split_commands
+
+# Nodes that may be left out of a header
+OPTIONAL_NODES = {"IMM", "DATA"}
+OPTIONAL_ROOTS = {"SOUR", "SENS"}
+
+# Arguments accepted by the ...:STAT switches
+BOOLEANS = {"ON", "OFF", "1", "0"}
+
+# Unit suffix -> multiplier to the base unit (Hz, s, dB, dBm, %)
+UNITS = {
+    "": 1,
+    "HZ": 1,
+    "KHZ": 1e3,
+    "MHZ": 1e6,
+    "GHZ": 1e9,
+    "S": 1,
+    "MS": 1e-3,
+    "US": 1e-6,
+    "DB": 1,
+    "DBM": 1,
+    "PCT": 1,
+}
+
+
+class StatusException(Exception):
+    """Raised like RsInstrument's StatusException when instrument_status_checking
+    finds entries in the error queue after a call"""
+
+
+class SCPIError(Exception):
+    """Error of one command; queued with the command text appended"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code},{message}")
+        self.code = code
+        self.message = message
+
+
+def short_form(node):
+    """SCPI short form of one header node, e.g. FREQuency -> FREQ, CALC1 -> CALC"""
+    match = re.fullmatch(r"(\*?[A-Za-z]+)(\d*)", node)
+    if not match:
+        return node.upper()
+    name, suffix = match[1].upper(), match[2]
+    if len(name) > 4 and not name.startswith("*"):
+        name = name[:3] if name[3] in "AEIOU" else name[:4]
+    return name + ("" if suffix == "1" else suffix)
+
+
+def normalize_header(header):
+    """Short-form header without optional nodes (SOUR:POW:LEV:IMM:AMPL -> POW:LEV:AMPL)"""
+    nodes = [short_form(node) for node in header.strip(" :").split(":") if node]
+    if nodes and nodes[0] in OPTIONAL_ROOTS:
+        nodes = nodes[1:]
+    return ":".join(node for node in nodes if node not in OPTIONAL_NODES)
+
+
+def parse_command(command):
+    """Split one command into (normalized header, is query, argument string)"""
+    match = re.match(r"\s*([^\s?]+)(\?)?\s*(.*)$", command)
+    return normalize_header(match[1]), bool(match[2]), match[3].strip()
+
+
+def parse_number(text):
+    """Value of a numeric argument such as "100 MHz", "30PCT" or "5e3", else None"""
+    if text is None:
+        return None
+    match = re.fullmatch(
+        r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([A-Za-z]*)\s*", text
+    )
+    if not match or match[2].upper() not in UNITS:
+        return None
+    return float(match[1]) * UNITS[match[2].upper()]
+
+
+class SimulatedBench:
+    """Signal path shared by the simulated generator and analyzer
+
+    Outputs set with settle=True move exponentially (time constant
+    settle_tau seconds) from the value they had to the new one. The last
+    HISTORY changes of each output are kept, so output_at() can replay an
+    output over a past interval (a trace capture). Time is taken from
+    clock, or from the default clock (see clock.get_clock).
+    """
+
+    HISTORY = 256
+
+    def __init__(self, settle_tau=0.2, clock=None):
+        self.settle_tau = settle_tau
+        self._clock = clock
+        self.switches = {"rf_on": False, "am_on": False, "fm_on": False}
+        # name -> [(time of change, value, previous value), ...]
+        self._outputs = {}
+
+    @property
+    def clock(self):
+        return self._clock or get_clock()
+
+    def set_output(self, name, value, settle=True):
+        previous = self.output(name, value) if settle else value
+        changes = self._outputs.setdefault(name, [])
+        changes.append((self.clock.monotonic(), value, previous))
+        del changes[: -self.HISTORY]
+
+    def output(self, name, default=0.0):
+        if name not in self._outputs:
+            return default
+        changed_at, value, previous = self._outputs[name][-1]
+        if previous == value or not self.settle_tau:
+            return value
+        elapsed = self.clock.monotonic() - changed_at
+        return value + (previous - value) * math.exp(-elapsed / self.settle_tau)
+
+    def output_at(self, name, times, default=0.0):
+        """Output at each of times (a NumPy array of clock times)"""
+        import numpy as np
+
+        if name not in self._outputs:
+            return np.full(len(times), default)
+        changed_at, values, previous = map(np.array, zip(*self._outputs[name]))
+        index = np.searchsorted(changed_at, times, side="right") - 1
+        latest = np.maximum(index, 0)
+        output = values[latest]
+        if self.settle_tau:
+            elapsed = np.maximum(times - changed_at[latest], 0)
+            output = output + (previous[latest] - output) * np.exp(
+                -elapsed / self.settle_tau
+            )
+        # Before the first change kept, the output had its previous value
+        return np.where(index < 0, previous[0], output)
+
+
+class SimulatedInstrument:
+    """SCPI instrument on a SimulatedBench, with the RsInstrument call interface
+
+    Every message costs command_latency seconds plus the LATENCY of each of
+    its headers, and responses travel at transfer_rate bytes per second.
+    Headers in OPERATION_TIMES start an overlapped operation that *OPC?
+    waits for. Any header can be set and queried back; unknown queries put
+    -113 in the error queue, and each setting has an error_rate chance of
+    adding a random error. Error queue entries end with the command that
+    caused them, and with instrument_status_checking set a call that leaves
+    entries in the queue raises StatusException, as with RsInstrument.
+    """
+
+    IDN = "Rohde&Schwarz,Simulated,000000/000,1.0"
+    # Settings after *RST (normalized header -> argument string)
+    DEFAULTS = {}
+    # Extra processing seconds per command, by normalized header prefix
+    LATENCY = {}
+    # Seconds until an operation started by a header completes
+    OPERATION_TIMES = {}
+    RANDOM_ERRORS = [(-221, "Settings conflict")]
+
+    def __init__(
+        self,
+        bench,
+        latency=None,
+        command_latency=0.005,
+        transfer_rate=10e6,
+        error_rate=0.0,
+    ):
+        self.bench = bench
+        self.latency_table = {**self.LATENCY, **(latency or {})}
+        self.command_latency = command_latency
+        self.transfer_rate = transfer_rate
+        self.error_rate = error_rate
+        # Replaced by the asyncio adapter, which awaits latencies instead
+        self.sleep = None
+        self.idn_string = self.IDN
+        self.visa_manufacturer = "Simulated"
+        self.instrument_options = []
+        self.instrument_status_checking = False
+        self.busy_until = 0.0
+        self.errors = []
+        self.commands_received = 0
+        self.settings = dict(self.DEFAULTS)
+
+    def latency(self, message):
+        """Seconds the instrument takes to accept a message"""
+        seconds = self.command_latency
+        for command in split_commands(message):
+            header, _, _ = parse_command(command)
+            for prefix, extra in self.latency_table.items():
+                if header.startswith(prefix):
+                    seconds += extra
+                    break
+        return seconds
+
+    def write_str(self, message):
+        self._wait(self.latency(message))
+        for command in split_commands(message):
+            self._execute(command)
+        self._check_status(message)
+
+    def write(self, command):
+        self.write_str(command)
+
+    def query_str(self, message):
+        self._wait(self.latency(message))
+        response = ";".join(
+            self._execute(command) or "" for command in split_commands(message)
+        )
+        self._wait(len(response) / self.transfer_rate)
+        self._check_status(message)
+        return response
+
+    def query_float(self, message):
+        return float(self.query_str(message))
+
+    def query_bin_block(self, query):
+        """Payload of a binary block query, as RsInstrument returns it"""
+        self._wait(self.latency(query))
+        header, _, args = parse_command(query)
+        payload = self._query_block(header, args)
+        self._wait(len(payload) / self.transfer_rate)
+        return payload
+
+    def query_opc(self, timeout=0):
+        remaining = self.busy_until - self.bench.clock.monotonic()
+        if timeout and remaining > timeout / 1000:
+            self._wait(timeout / 1000)
+            raise TimeoutError(f"*OPC? timed out after {timeout} ms")
+        self._wait(remaining)
+        return 1
+
+    def close(self):
+        pass
+
+    def reset(self):
+        self.settings = dict(self.DEFAULTS)
+        self.busy_until = 0.0
+
+    def _check_status(self, message):
+        if self.instrument_status_checking and self.errors:
+            errors, self.errors = self.errors, []
+            raise StatusException(
+                f"Instrument error(s) detected after {message!r}: {', '.join(errors)}"
+            )
+
+    def _wait(self, seconds):
+        if seconds > 0:
+            (self.sleep or self.bench.clock.sleep)(seconds)
+
+    def _execute(self, command):
+        header, is_query, args = parse_command(command)
+        self.commands_received += 1
+
+        if not is_query:
+            if header == "*RST":
+                self.reset()
+            elif header == "*CLS":
+                self.errors = []
+            elif header != "*WAI":
+                try:
+                    if header.endswith(":STAT") and args.upper() not in BOOLEANS:
+                        raise SCPIError(-224, "Illegal parameter value")
+                    self._apply(header, args)
+                except SCPIError as error:
+                    self._queue_error(error, command)
+                    return None
+                self.settings[header] = args
+                if random.random() < self.error_rate:
+                    self._queue_error(
+                        SCPIError(*random.choice(self.RANDOM_ERRORS)), command
+                    )
+            for prefix, duration in self.OPERATION_TIMES.items():
+                if header.startswith(prefix):
+                    self.busy_until = max(
+                        self.busy_until, self.bench.clock.monotonic() + duration
+                    )
+            return None
+
+        if header == "*OPC":
+            return str(self.query_opc())
+        if header == "*IDN":
+            return self.idn_string
+        if header == "*STB":
+            # Bit 2: error/event queue not empty
+            return "4" if self.errors else "0"
+        if header == "SYST:ERR":
+            return self.errors.pop(0) if self.errors else '0,"No error"'
+        response = self._query(header, args)
+        if response is not None:
+            return response
+        if header in self.settings:
+            return self.settings[header]
+        self._queue_error(SCPIError(-113, "Undefined header"), command)
+        return "0"
+
+    def _queue_error(self, error, command):
+        self.errors.append(f'{error.code},"{error.message};{command.strip()}"')
+
+    def _apply(self, header, args):
+        """Side effect of a setting on the bench"""
+
+    def _query(self, header, args):
+        """Response to an instrument-specific query, or None"""
+        return None
+
+    def _query_block(self, header, args):
+        return self._execute(f"{header}? {args}").encode()
+
+
+class SimulatedSigGen(SimulatedInstrument):
+    IDN = "Rohde&Schwarz,SMB100A (simulated),000000/000,1.0"
+    DEFAULTS = {
+        "FREQ:CW": "1 GHz",
+        "POW:LEV:AMPL": "-30",
+        "AM:DEPT": "30PCT",
+        "FM:INT:DEV": "1 kHz",
+        "OUTP:STAT": "OFF",
+        "AM:STAT": "OFF",
+        "FM:STAT": "OFF",
+    }
+    OPERATION_TIMES = {"FREQ:CW": 0.3, "OUTP:ALL:STAT": 0.5, "OUTP:STAT": 0.5}
+
+    # Setting -> bench output, and whether the output settles after a change
+    OUTPUTS = {
+        "FREQ:CW": ("frequency", False),
+        "POW:LEV:AMPL": ("level", True),
+        "AM:DEPT": ("am_depth", True),
+        "FM:INT:DEV": ("fm_dev", True),
+        "FM:DEV": ("fm_dev", True),
+    }
+    SWITCHES = {
+        "OUTP:ALL:STAT": "rf_on",
+        "OUTP:STAT": "rf_on",
+        "AM:STAT": "am_on",
+        "FM:STAT": "fm_on",
+    }
+
+    def __init__(self, bench, **kwargs):
+        super().__init__(bench, **kwargs)
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        for header, args in self.DEFAULTS.items():
+            self._apply(header, args, settle=False)
+
+    def _apply(self, header, args, settle=True):
+        if header in self.OUTPUTS:
+            value = parse_number(args)
+            if value is None:
+                raise SCPIError(-104, "Data type error")
+            output, settles = self.OUTPUTS[header]
+            self.bench.set_output(output, value, settle and settles)
+        elif header in self.SWITCHES:
+            self.bench.switches[self.SWITCHES[header]] = args.upper() in ("ON", "1")
+
+
+class SimulatedFSMR(SimulatedInstrument):
+    IDN = "Rohde&Schwarz,FSMR26 (simulated),000000/000,1.0"
+    DEFAULTS = {
+        "FREQ:CENT": "1 GHz",
+        "FORM": "ASC",
+        "FORM:BORD": "NORM",
+        "CALC2:FEED": "'XTIM:AM:REL'",
+        "INIT:CONT": "ON",
+        "SWE:TIME": "10MS",
+    }
+    LATENCY = {"CORR:COLL": 0.05, "CAL:PMET:ZERO": 0.05}
+    OPERATION_TIMES = {
+        "FREQ:CENT": 1.5,
+        "PMET:STAT": 1.0,
+        "CAL:PMET:ZERO": 4.0,
+        "CORR:COLL": 6.0,
+    }
+    # One-sigma noise of the readings: AM depth (%), FM deviation (Hz), level (dB)
+    READING_NOISE = {"am_depth": 0.01, "fm_dev": 1.0, "level": 0.005}
+    # Largest generator/analyzer frequency offset that still counts as tuned
+    TUNING_TOLERANCE = 10e3
+    NOISE_FLOOR = -140.0
+
+    def __init__(self, bench, trace_points=4096, tone_frequency=1e3, **kwargs):
+        super().__init__(bench, **kwargs)
+        self.trace_points = trace_points
+        self.tone_frequency = tone_frequency
+        self.capture = None
+
+    def reset(self):
+        super().reset()
+        # (start, sweep time) of the last single sweep, None when continuous
+        self.capture = None
+
+    def _apply(self, header, args):
+        if header == "INIT":
+            # A single sweep records SWE:TIME seconds from now; *OPC? waits
+            # for it to finish
+            start = self.bench.clock.monotonic()
+            sweep_time = parse_number(self.settings["SWE:TIME"])
+            self.capture = (start, sweep_time)
+            self.busy_until = max(self.busy_until, start + sweep_time)
+        elif header == "INIT:CONT" and args.upper() in ("ON", "1"):
+            self.capture = None
+
+    def _query(self, header, args):
+        readings = {
+            "CALC:MARK:FUNC:ADEM:AM": lambda: self._modulation("am_depth", "am_on"),
+            "CALC:MARK:FUNC:ADEM:FM": lambda: self._modulation("fm_dev", "fm_on"),
+            "CALC:MARK:FUNC:ADEM:DIST:RES": self._distortion,
+            "CALC:MARK:FUNC:ADEM:CARR:RES": self._level,
+            "CALC:MARK:FUNC:ADEM:CARR:SUNC": self._uncertainty,
+            "ADEM:SRAT": self.sample_rate,
+        }
+        if header in readings:
+            return f"{readings[header]():.6g}"
+        if header.startswith("TRAC"):
+            return ",".join(f"{value:.6g}" for value in self.trace())
+        return None
+
+    def _query_block(self, header, args):
+        if self.settings["FORM"].upper().startswith("ASC"):
+            return super()._query_block(header, args)
+        byte_order = "<" if self.settings["FORM:BORD"].upper() == "SWAP" else ">"
+        return self.trace().astype(f"{byte_order}f4").tobytes()
+
+    def sample_rate(self):
+        """Demodulation sample rate: trace_points samples per sweep"""
+        return self.trace_points / parse_number(self.settings["SWE:TIME"])
+
+    def trace(self):
+        """Demodulated waveform of the CALC2:FEED trace, trace_points samples
+
+        After a single sweep (INIT:CONT OFF; INIT) the trace follows every
+        change the generator made during that sweep; otherwise it holds the
+        present signal.
+        """
+        import numpy as np
+        from trace_analysis import synthetic_tone
+
+        if "FM" in self.settings["CALC2:FEED"].upper():
+            output, switch = "fm_dev", "fm_on"
+        else:
+            output, switch = "am_depth", "am_on"
+        if self.capture:
+            start, sweep_time = self.capture
+            times = start + np.arange(self.trace_points) * (
+                sweep_time / self.trace_points
+            )
+            amplitude = self.bench.output_at(output, times)
+            if not (self._tuned() and self.bench.switches[switch]):
+                amplitude = np.zeros(self.trace_points)
+        else:
+            amplitude = self._modulation(output, switch)
+        return synthetic_tone(
+            amplitude,
+            self.tone_frequency,
+            self.sample_rate(),
+            self.trace_points,
+            harmonics=(0.01, 0.003),
+            noise=abs(amplitude) * 0.001,
+            phase=random.uniform(0, 2 * math.pi),
+        )
+
+    def _tuned(self):
+        centre = parse_number(self.settings["FREQ:CENT"])
+        return (
+            self.bench.switches["rf_on"]
+            and centre is not None
+            and abs(centre - self.bench.output("frequency")) <= self.TUNING_TOLERANCE
+        )
+
+    def _modulation(self, output, switch):
+        value = 0.0
+        if self._tuned() and self.bench.switches[switch]:
+            value = self.bench.output(output)
+        return value + random.gauss(0, self.READING_NOISE[output])
+
+    def _level(self):
+        level = self.bench.output("level") if self._tuned() else self.NOISE_FLOOR
+        return level + random.gauss(0, self.READING_NOISE["level"])
+
+    def _distortion(self):
+        # THD in % grows with carrier frequency
+        frequency = self.bench.output("frequency")
+        return 0.05 + frequency / 1e9 + abs(random.gauss(0, 0.005))
+
+    def _uncertainty(self):
+        # Level uncertainty in dB grows with carrier frequency
+        return 0.005 + 0.02 * self.bench.output("frequency") / 1e9
+
+
+def create_simulated_instruments(settle_tau=0.2, clock=None, **kwargs):
+    """An (FSMR, SigGen) pair on one bench; kwargs go to both instruments"""
+    bench = SimulatedBench(settle_tau, clock)
+    return SimulatedFSMR(bench, **kwargs), SimulatedSigGen(bench, **kwargs)
@@ -0,0 +1,167 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from instrument_utils import initialize_instruments
+from scpi_session import StateCachingSession
+from scheduler import PHASE_MAJOR, build_execution_plan, execute_plan
+
+# How the work is shared between stations
+SPLIT_FREQUENCIES = "split"  # one UUC, frequency plan divided across benches
+SEPARATE_UUCS = "per_uuc"  # every bench runs the full plan on its own UUC
+
+
+def get_station_configs(config):
+    """Return the FSMR/SigGen address pairs listed in INSTRUMENT_CONFIG
+
+    Uses config["stations"] when present, otherwise the single
+    fsmr_address/siggen_address pair.
+    """
+    stations = config.get("stations")
+    if not stations:
+        stations = [
+            {
+                "fsmr_address": config["fsmr_address"],
+                "siggen_address": config["siggen_address"],
+            }
+        ]
+    return [
+        {"name": station.get("name", f"station{index + 1}"), **station}
+        for index, station in enumerate(stations)
+    ]
+
+
+def split_frequency_points(freq_points, n_stations):
+    """Deal frequency points round-robin so each station gets a similar span"""
+    return [freq_points[index::n_stations] for index in range(n_stations)]
+
+
+def run_station(
+    station,
+    freq_points,
+    mod_depths,
+    level_points,
+    mqtt_client,
+    notification_manager,
+    use_mock=True,
+    plan_order=PHASE_MAJOR,
+    mod_devs=(),
+):
+    """Run the calibration plan for one FSMR/SigGen pair
+
+    Returns {"am": {freq_display: [...]}, "fm": {...}, "level": {...}}.
+    """
+    results = {"am": {}, "fm": {}, "level": {}}
+    name = station["name"]
+
+    FSMR_STD, SigGen_UUC = initialize_instruments(station, use_mock=use_mock)
+    if not FSMR_STD or not SigGen_UUC:
+        notification_manager.log_error(f"[{name}] Failed to initialize instruments")
+        return results
+
+    FSMR_STD = StateCachingSession(FSMR_STD, f"{name} FSMR")
+    SigGen_UUC = StateCachingSession(SigGen_UUC, f"{name} SigGen")
+
+    def collect_results(measurement_type, freq, step_results):
+        for result in step_results:
+            result.station = name
+        results[measurement_type].setdefault(freq["display"], []).extend(step_results)
+
+    try:
+        plan = build_execution_plan(
+            freq_points,
+            mod_depths,
+            level_points,
+            order=plan_order,
+            mod_devs=mod_devs,
+        )
+        execute_plan(
+            plan,
+            FSMR_STD,
+            SigGen_UUC,
+            mqtt_client,
+            _StationNotifications(notification_manager, name),
+            collect_results,
+        )
+    finally:
+        print(FSMR_STD.report())
+        print(SigGen_UUC.report())
+        FSMR_STD.close()
+        SigGen_UUC.close()
+
+    return results
+
+
+def run_stations(
+    instrument_config,
+    freq_points,
+    mod_depths,
+    level_points,
+    mqtt_client,
+    notification_manager,
+    use_mock=True,
+    mode=SPLIT_FREQUENCIES,
+    plan_order=PHASE_MAJOR,
+    mod_devs=(),
+):
+    """Run the calibration on every configured station in parallel
+
+    Returns one merged {"am": [...], "fm": [...], "level": [...]} result set
+    ordered by frequency (as in freq_points) and then by station.
+    """
+    stations = get_station_configs(instrument_config)
+    if mode == SPLIT_FREQUENCIES:
+        station_freqs = split_frequency_points(freq_points, len(stations))
+    elif mode == SEPARATE_UUCS:
+        station_freqs = [freq_points] * len(stations)
+    else:
+        raise ValueError(f"Unknown station mode: {mode}")
+
+    with ThreadPoolExecutor(max_workers=len(stations)) as pool:
+        futures = [
+            pool.submit(
+                run_station,
+                station,
+                freqs,
+                mod_depths,
+                level_points,
+                mqtt_client,
+                notification_manager,
+                use_mock,
+                plan_order,
+                mod_devs,
+            )
+            for station, freqs in zip(stations, station_freqs)
+            if freqs
+        ]
+
+        station_results = []
+        for future in futures:
+            try:
+                station_results.append(future.result())
+            except Exception as e:
+                notification_manager.log_error(f"Station failed: {str(e)}")
+
+    merged = {"am": [], "fm": [], "level": []}
+    for measurement_type in merged:
+        for freq in freq_points:
+            for results in station_results:
+                merged[measurement_type].extend(
+                    results[measurement_type].get(freq["display"], [])
+                )
+    return merged
+
+
+class _StationNotifications:
+    """Prefixes errors and warnings with the station name"""
+
+    def __init__(self, notification_manager, name):
+        self.notification_manager = notification_manager
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self.notification_manager, attribute)
+
+    def log_error(self, error_msg, stack_trace=None):
+        self.notification_manager.log_error(f"[{self.name}] {error_msg}", stack_trace)
+
+    def log_warning(self, warning_msg):
+        self.notification_manager.log_warning(f"[{self.name}] {warning_msg}")
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from binary_block import block_dtype, parse_block, read_block
+
+
+def make_block(payload, header=None):
+    length = str(len(payload))
+    header = f"#{len(length)}{length}".encode() if header is None else header
+    return header + payload
+
+
+@pytest.mark.parametrize("byte_order, numpy_order", [("SWAP", "<"), ("NORM", ">")])
+def test_byte_order(byte_order, numpy_order):
+    values = np.array([1.5, -2.25, 1e6], dtype=np.float32)
+    block = make_block(values.astype(f"{numpy_order}f4").tobytes())
+
+    parsed = parse_block(block, block_dtype(byte_order))
+
+    assert parsed.dtype == np.dtype(f"{numpy_order}f4")
+    np.testing.assert_array_equal(parsed, values)
+
+
+def test_payload_is_a_view_and_trailing_bytes_are_ignored():
+    values = np.arange(4, dtype="<f4")
+    block = bytearray(make_block(values.tobytes()) + b"\n")
+
+    parsed = parse_block(block)
+    block[-5:-1] = np.array([9], dtype="<f4").tobytes()
+
+    assert parsed.base is not None
+    np.testing.assert_array_equal(parsed, [0, 1, 2, 9])
+
+
+@pytest.mark.parametrize(
+    "block, message",
+    [
+        (b"1.0,2.0,3.0", "Not an IEEE 488.2 binary block"),
+        (b"#0" + bytes(8), "Indefinite-length"),
+        (b"#x12" + bytes(12), "invalid literal"),
+    ],
+)
+def test_bad_header(block, message):
+    with pytest.raises(ValueError, match=message):
+        parse_block(block)
+
+
+def test_truncated_block():
+    block = make_block(bytes(16), header=b"#220")
+
+    with pytest.raises(ValueError, match="truncated: 16 of 20 bytes"):
+        parse_block(block)
+
+
+def test_length_not_a_multiple_of_the_value_size():
+    with pytest.raises(ValueError):
+        parse_block(make_block(bytes(10)))
+
+
+def test_read_block_from_raw_visa_session():
+    class VisaSession:
+        def write(self, query):
+            self.query = query
+
+        def read_raw(self):
+            return make_block(np.array([0.5, 0.25], dtype=">f4").tobytes())
+
+    session = VisaSession()
+    values = read_block(session, "TRAC2:DATA? TRACE1", byte_order="NORM")
+
+    assert session.query == "TRAC2:DATA? TRACE1"
+    np.testing.assert_array_equal(values, [0.5, 0.25])
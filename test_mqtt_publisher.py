@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+
+from mqtt_publisher import BufferedPublisher
+
+
+class MessageInfo:
+    def __init__(self, mid, acked):
+        self.mid = mid
+        self.rc = 0
+        self.acked = acked
+
+    def is_published(self):
+        return self.acked
+
+
+class FakeClient:
+    """Stays connected, drops the acks of the first drop_acks messages and
+    holds publish() until release is set"""
+
+    def __init__(self, drop_acks=0):
+        self.drop_acks = drop_acks
+        self.release = threading.Event()
+        self.sent = []
+        self.acked = []
+
+    def is_connected(self):
+        return True
+
+    def publish(self, topic, payload, qos=1):
+        self.release.wait()
+        self.sent.append(payload)
+        acked = len(self.sent) > self.drop_acks
+        if acked:
+            self.acked.append(payload)
+        return MessageInfo(len(self.sent), acked)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def make_publisher(client, tmp_path, **kwargs):
+    return BufferedPublisher(client, spill_path=str(tmp_path / "spill.jsonl"), **kwargs)
+
+
+def test_spilled_messages_are_replayed_while_connected(tmp_path, monkeypatch):
+    monkeypatch.setattr(BufferedPublisher, "REPLAY_INTERVAL", 0.2)
+    client = FakeClient(drop_acks=2)
+    publisher = make_publisher(client, tmp_path, max_queue=2, ack_timeout=0.3)
+    payloads = [f"message {index}" for index in range(6)]
+    for payload in payloads:
+        publisher.publish("results", payload)
+    # The worker holds one message, two are queued, the rest were spilled
+    assert publisher.spilled >= 3
+
+    client.release.set()
+    # Dropped acks time out and are spilled; everything arrives without a
+    # reconnect and without closing
+    assert wait_until(lambda: sorted(client.acked) == sorted(payloads))
+    assert wait_until(lambda: not os.path.exists(publisher.replay_path))
+    assert not os.path.exists(publisher.spill_path)
+
+    publisher.close(timeout=2)
+    assert publisher.published == len(payloads)
+
+
+def test_close_replays_the_spill_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(BufferedPublisher, "REPLAY_INTERVAL", 60)
+    client = FakeClient()
+    publisher = make_publisher(client, tmp_path, max_queue=1)
+    # Let the first replay check pass before anything is spilled
+    time.sleep(0.3)
+    payloads = [f"message {index}" for index in range(4)]
+    for payload in payloads:
+        publisher.publish("results", payload)
+    client.release.set()
+
+    publisher.close(timeout=2)
+    assert sorted(client.acked) == sorted(payloads)
+    assert not os.path.exists(publisher.spill_path)
+    assert not os.path.exists(publisher.replay_path)
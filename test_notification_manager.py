@@ -0,0 +1,97 @@
+import socketserver
+import threading
+
+import pytest
+
+from notification_manager import NotificationManager
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: one session per connection"""
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost test SMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode().strip().split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                    lines.append(line)
+                with server.lock:
+                    server.messages.append(b"".join(lines))
+                    drop = len(server.messages) == server.drop_after
+                self.reply("250 Queued")
+                if drop:
+                    return  # Server ends the session without QUIT
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def reply(self, text):
+        self.wfile.write(f"{text}\r\n".encode())
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SmtpHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.messages = []
+    server.drop_after = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_manager(server):
+    host, port = server.server_address
+    email_config = {
+        "smtp_server": host,
+        "smtp_port": port,
+        "sender_email": "cal@example.com",
+        "recipient_emails": ["lab@example.com", "qa@example.com"],
+        "use_tls": False,
+        "smtp_timeout": 5,
+    }
+    return NotificationManager(email_config, {})
+
+
+def test_one_session_carries_several_emails(smtp_server):
+    manager = make_manager(smtp_server)
+    for index in range(3):
+        manager.send_email(f"Report {index}", "body")
+    manager.close()
+
+    assert manager.smtp_connections_opened == 1
+    assert manager.emails_sent == 3
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 3
+
+
+def test_dropped_session_reconnects_once(smtp_server):
+    smtp_server.drop_after = 1
+    manager = make_manager(smtp_server)
+    for index in range(3):
+        manager.send_email(f"Report {index}", "body")
+    manager.close()
+
+    assert manager.smtp_connections_opened == 2
+    assert manager.emails_sent == 3
+    assert smtp_server.connections == 2
+    assert len(smtp_server.messages) == 3
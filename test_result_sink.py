@@ -0,0 +1,108 @@
+import csv
+
+import pytest
+
+from result_sink import ResultSink, load_binary_results
+
+
+def am_row(frequency, am_value):
+    return {
+        "frequency": frequency,
+        "amValue": am_value,
+        "distortion": 0.5,
+        "timestamp": "12:00:00",
+    }
+
+
+def read_csv(path):
+    with open(path, newline="") as result_file:
+        return list(csv.reader(result_file))
+
+
+def test_unknown_format_is_rejected_before_opening_files(tmp_path):
+    existing = tmp_path / "AM_MOD_Results.txt"
+    existing.write_text("earlier results\n")
+
+    with pytest.raises(ValueError, match="npy.*csv, binary, parquet"):
+        ResultSink(f"{tmp_path}/", formats=("csv", "npy"))
+
+    assert existing.read_text() == "earlier results\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["AM_MOD_Results.txt"]
+
+
+def test_csv_rows_are_written_on_commit(tmp_path):
+    with ResultSink(f"{tmp_path}/", commit_every=2) as sink:
+        sink.write("am", [am_row("1000 MHz", 30.1)])
+        assert sink.pending_rows() == 1
+        sink.write("am", [am_row("2000 MHz", 30.2)])
+        assert sink.pending_rows() == 0
+        assert read_csv(tmp_path / "AM_MOD_Results.txt") == [
+            ["Frequency", "AM Modulation (%)", "Distortion (%)", "Timestamp"],
+            ["1000 MHz", "30.1", "0.5", "12:00:00"],
+            ["2000 MHz", "30.2", "0.5", "12:00:00"],
+        ]
+
+    assert sink.rows_written == 2
+    assert read_csv(tmp_path / "LEVEL_Results.txt") == [
+        ["Frequency", "Measured", "Uncertainty", "Timestamp"]
+    ]
+
+
+def test_csv_append_keeps_rows_and_header(tmp_path):
+    with ResultSink(f"{tmp_path}/") as sink:
+        sink.write("am", [am_row("1000 MHz", 30.1)])
+    with ResultSink(f"{tmp_path}/", append=True) as sink:
+        sink.write("am", [am_row("2000 MHz", 30.2)])
+
+    rows = read_csv(tmp_path / "AM_MOD_Results.txt")
+    assert [row[0] for row in rows] == ["Frequency", "1000 MHz", "2000 MHz"]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_binary_records_load_back(tmp_path, mmap):
+    with ResultSink(f"{tmp_path}/", formats=("binary",)) as sink:
+        sink.write("am", [am_row("1000 MHz", 30.1), am_row("2000 MHz", 30.2)])
+
+    records = load_binary_results(f"{tmp_path}/AM_MOD_Results", mmap=mmap)
+    assert list(records["frequency"]) == ["1000 MHz", "2000 MHz"]
+    assert list(records["amValue"]) == [30.1, 30.2]
+    assert len(load_binary_results(f"{tmp_path}/LEVEL_Results", mmap=mmap)) == 0
+
+
+def test_binary_string_columns_widen_instead_of_truncating(tmp_path):
+    long_frequency = "1000.000000001 MHz (station 2)"
+    with ResultSink(f"{tmp_path}/", formats=("binary",)) as sink:
+        sink.write("am", [am_row("1000 MHz", 30.1)])
+        sink.commit()
+        sink.write("am", [am_row(long_frequency, 30.2)])
+
+    records = load_binary_results(f"{tmp_path}/AM_MOD_Results")
+    assert list(records["frequency"]) == ["1000 MHz", long_frequency]
+
+
+def test_binary_append_extends_existing_records(tmp_path):
+    with ResultSink(f"{tmp_path}/", formats=("binary",)) as sink:
+        sink.write("am", [am_row("1000 MHz", 30.1)])
+    with ResultSink(f"{tmp_path}/", formats=("binary",), append=True) as sink:
+        sink.write("am", [am_row("2000 MHz and some more", 30.2)])
+
+    records = load_binary_results(f"{tmp_path}/AM_MOD_Results", mmap=False)
+    assert list(records["frequency"]) == ["1000 MHz", "2000 MHz and some more"]
+    assert list(records["amValue"]) == [30.1, 30.2]
+
+
+def test_parquet_writes_one_part_per_run(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    with ResultSink(f"{tmp_path}/", formats=("parquet",)) as sink:
+        sink.write("am", [am_row("1000 MHz", 30.1)])
+        sink.commit()
+        sink.write("am", [am_row("2000 MHz", 30.2)])
+    with ResultSink(f"{tmp_path}/", formats=("parquet",), append=True) as sink:
+        sink.write("am", [am_row("3000 MHz", 30.3)])
+
+    first = pq.read_table(tmp_path / "AM_MOD_Results.parquet").to_pydict()
+    assert first["frequency"] == ["1000 MHz", "2000 MHz"]
+    assert first["amValue"] == [30.1, 30.2]
+    resumed = pq.read_table(tmp_path / "AM_MOD_Results.1.parquet").to_pydict()
+    assert resumed["frequency"] == ["3000 MHz"]
@@ -0,0 +1,193 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from clock import VirtualClock, use_clock
+from notification_manager import NotificationManager
+from result_sink import ResultSink
+from results import AmResult, LevelResult
+from run_journal import RunJournal, load_journal, remove_completed
+from scheduler import (
+    FREQUENCY_MAJOR,
+    PHASE_MAJOR,
+    SHARED_TUNING,
+    build_execution_plan,
+    execute_plan,
+)
+from scpi_simulator import create_simulated_instruments
+
+FREQ_POINTS = [
+    {"display": "1000 MHz", "value": "1000e6"},
+    {"display": "2000 MHz", "value": "2000e6"},
+]
+MOD_DEPTHS = [{"depth": "30PCT", "delay": 0.1}, {"depth": "80PCT", "delay": 0.1}]
+MOD_DEVS = [{"dev": "5e3", "delay": 0.1}]
+LEVEL_POINTS = [{"level": "0", "delay": 0.1}, {"level": "-20", "delay": 0.1}]
+FREQ = FREQ_POINTS[0]
+
+
+def am_result(depth, am_value=30.0):
+    return AmResult("1000 MHz", 1e9, depth, am_value, 0.5, 0, 0)
+
+
+def make_plan(order):
+    return build_execution_plan(
+        FREQ_POINTS, MOD_DEPTHS, LEVEL_POINTS, order=order, mod_devs=MOD_DEVS
+    )
+
+
+def measured_points(plan):
+    keys = {"am": "depth", "fm": "dev", "level": "level"}
+    return sorted(
+        (step["action"], step["freq"]["display"], point[keys[step["action"]]])
+        for step in plan
+        if step["action"] in keys
+        for point in step["points"]
+    )
+
+
+def test_torn_last_line_is_skipped_and_resume_appends_whole_entries(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = RunJournal(path)
+    journal.record_results("am", FREQ, [am_result("30PCT")])
+    journal.close()
+    with open(path, "a") as journal_file:
+        journal_file.write('{"event": "point", "type": "am", "freq')
+
+    assert load_journal(path)["completed"] == {("am", "1000 MHz", "30PCT")}
+
+    journal = RunJournal(path, resume=True)
+    journal.record_results("am", FREQ, [am_result("80PCT")])
+    journal.close()
+    state = load_journal(path)
+    assert state["completed"] == {
+        ("am", "1000 MHz", "30PCT"),
+        ("am", "1000 MHz", "80PCT"),
+    }
+    assert state["start_time"] is not None
+
+
+@pytest.mark.parametrize("order", [FREQUENCY_MAJOR, PHASE_MAJOR, SHARED_TUNING])
+def test_remove_completed_keeps_only_open_points(order):
+    plan = make_plan(order)
+    completed = {("am", freq["display"], "30PCT") for freq in FREQ_POINTS}
+    completed |= {("level", "1000 MHz", "0"), ("level", "1000 MHz", "-20")}
+    completed.add(("fm", "2000 MHz", "5e3"))
+
+    remaining = remove_completed(plan, completed)
+
+    assert measured_points(remaining) == sorted(
+        set(measured_points(plan)) - completed
+    )
+    assert any(
+        step["action"] == "zero_power_meter" or step.get("zero_power_meter")
+        for step in remaining
+    )
+    # Resets and the order of what is left stay as planned
+    assert [step for step in remaining if step["action"] == "reset"]
+    assert measured_points(remove_completed(plan, set(measured_points(plan)))) == []
+
+
+@pytest.mark.parametrize("order", [PHASE_MAJOR, SHARED_TUNING])
+def test_power_meter_zero_is_dropped_with_the_last_level_step(order):
+    plan = make_plan(order)
+    completed = {
+        ("level", freq["display"], point["level"])
+        for freq in FREQ_POINTS
+        for point in LEVEL_POINTS
+    }
+
+    remaining = remove_completed(plan, completed)
+
+    assert not any(step["action"] in ("level", "zero_power_meter") for step in remaining)
+    assert [step for step in remaining if step["action"] == "am"]
+
+
+def test_notification_manager_restores_summary(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = RunJournal(path)
+    manager = NotificationManager({}, {}, journal=journal)
+    manager.log_warning("SigGen error queue: -222")
+    journal.record_results("am", FREQ, [am_result("30PCT", 30.0), am_result("80PCT", 80.0)])
+    journal.record_results(
+        "level", FREQ, [LevelResult("1000 MHz", 1e9, "0", -0.1, 0.02, 0, 0)]
+    )
+    journal.record_error("Error processing frequency 2000 MHz", datetime.now())
+    journal.close()
+
+    restored = NotificationManager({}, {})
+    restored.restore(load_journal(path))
+
+    summary = restored.summary_data
+    assert summary["total_measurements"] == 3
+    assert [error["message"] for error in summary["errors"]] == [
+        "Error processing frequency 2000 MHz"
+    ]
+    assert [warning["message"] for warning in summary["warnings"]] == [
+        "SigGen error queue: -222"
+    ]
+    assert summary["start_time"] == load_journal(path)["start_time"]
+    am_stats = restored.measurement_stats["am"]["all"]["amValue"]
+    assert am_stats.count == 2
+    assert am_stats.mean == pytest.approx(55.0)
+
+
+class Crash(BaseException):
+    """Stands in for the process dying; execute_plan only catches Exception"""
+
+
+def run(tmp_path, plan, resume, crash_after=None):
+    """The run_calibration flow: commit each step, then journal it"""
+    journal_path = tmp_path / "journal.jsonl"
+    journal_state = load_journal(journal_path) if resume else None
+    journal = RunJournal(journal_path, resume=resume)
+    manager = NotificationManager({}, {}, journal=journal)
+    if journal_state:
+        manager.restore(journal_state)
+        plan = remove_completed(plan, journal_state["completed"])
+    steps = []
+
+    FSMR_STD, SigGen_UUC = create_simulated_instruments()
+    try:
+        with ResultSink(f"{tmp_path}/", durable=True, append=resume) as sink:
+
+            def write_results(measurement_type, freq, results):
+                for result in results:
+                    manager.log_measurement(result, measurement_type)
+                sink.write(measurement_type, results)
+                sink.commit()
+                journal.record_results(measurement_type, freq, results)
+                steps.append(measurement_type)
+                if len(steps) == crash_after:
+                    raise Crash()
+
+            execute_plan(plan, FSMR_STD, SigGen_UUC, None, manager, write_results)
+    finally:
+        journal.close()
+    return manager
+
+
+def test_resumed_run_measures_every_point_once(tmp_path):
+    plan = make_plan(SHARED_TUNING)
+    with use_clock(VirtualClock()):
+        with pytest.raises(Crash):
+            run(tmp_path, plan, resume=False, crash_after=4)
+        manager = run(tmp_path, plan, resume=True)
+
+    rows = {}
+    for measurement_type, name in [
+        ("am", "AM_MOD_Results"),
+        ("fm", "FM_MOD_Results"),
+        ("level", "LEVEL_Results"),
+    ]:
+        with open(tmp_path / f"{name}.txt", newline="") as result_file:
+            rows[measurement_type] = [row[0] for row in csv.reader(result_file)][1:]
+
+    assert rows["am"] == ["1000 MHz"] * 2 + ["2000 MHz"] * 2
+    assert rows["fm"] == ["1000 MHz", "2000 MHz"]
+    assert rows["level"] == ["1000 MHz"] * 2 + ["2000 MHz"] * 2
+    assert manager.summary_data["total_measurements"] == 10
+    assert load_journal(tmp_path / "journal.jsonl")["completed"] == set(
+        measured_points(plan)
+    )
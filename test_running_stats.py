@@ -0,0 +1,59 @@
+import random
+import statistics
+
+import numpy as np
+import pytest
+
+from utils.running_stats import P2Quantile, RunningStats
+
+
+@pytest.fixture
+def values():
+    generator = random.Random(1)
+    return [generator.gauss(30.0, 2.5) for _ in range(5000)]
+
+
+def test_moments_match_statistics(values):
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(statistics.fmean(values), rel=1e-12)
+    assert stats.variance == pytest.approx(statistics.variance(values), rel=1e-9)
+    assert stats.std == pytest.approx(statistics.stdev(values), rel=1e-9)
+    assert stats.min == min(values)
+    assert stats.max == max(values)
+
+
+def test_empty_and_single_value():
+    stats = RunningStats(quantiles=(0.5,))
+    assert stats.count == 0
+    assert stats.min is None and stats.max is None
+    assert stats.quantile(0.5) is None
+
+    stats.add(4.0)
+    assert (stats.mean, stats.variance, stats.min, stats.max) == (4.0, 0.0, 4.0, 4.0)
+    assert stats.quantile(0.5) == 4.0
+
+
+@pytest.mark.parametrize("p", [0.05, 0.25, 0.5, 0.75, 0.95])
+def test_p2_estimates_are_close_to_numpy(values, p):
+    estimator = P2Quantile(p)
+    for value in values:
+        estimator.add(value)
+
+    # Within 2 % of the spread of the data
+    assert estimator.value() == pytest.approx(
+        np.quantile(values, p), abs=0.02 * statistics.stdev(values)
+    )
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4])
+@pytest.mark.parametrize("p", [0.1, 0.5, 0.9])
+def test_fewer_than_five_values_give_the_nearest_rank(values, count, p):
+    stats = RunningStats(quantiles=(p,))
+    for value in values[:count]:
+        stats.add(value)
+
+    assert stats.quantile(p) == np.quantile(values[:count], p, method="nearest")
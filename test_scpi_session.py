@@ -0,0 +1,117 @@
+import pytest
+
+from clock import VirtualClock
+from scpi_session import BatchError, StateCachingSession, batch, is_action
+from scpi_simulator import create_simulated_instruments
+
+
+class Recorder:
+    """Passes calls through to a simulated instrument and logs the messages"""
+
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.messages = []
+
+    def write_str(self, message):
+        self.messages.append(message)
+        self.instrument.write_str(message)
+
+
+@pytest.fixture
+def fsmr():
+    FSMR_STD, _ = create_simulated_instruments(clock=VirtualClock())
+    FSMR_STD.instrument_status_checking = True
+    return Recorder(FSMR_STD)
+
+
+def test_batch_sends_one_compound_message(fsmr):
+    with batch(fsmr) as session:
+        session.write_str("FILT:HPAS ON")
+        session.write_str("FILT:HPAS:FREQ 300 HZ")
+        session.write_str("CAL:PMET:ZERO:AUTO ONCE; *WAI")
+
+    assert fsmr.messages == [
+        "FILT:HPAS ON;:FILT:HPAS:FREQ 300 HZ;:CAL:PMET:ZERO:AUTO ONCE;*WAI"
+    ]
+    assert fsmr.instrument.settings["FILT:HPAS:FREQ"] == "300 HZ"
+
+
+def test_batch_splits_long_messages(fsmr):
+    commands = [f"SWE:TIME {index} MS" for index in range(10)]
+    with batch(fsmr, max_length=40) as session:
+        for command in commands:
+            session.write_str(command)
+
+    assert len(fsmr.messages) > 1
+    assert all(len(message) <= 40 for message in fsmr.messages)
+    assert ";:".join(fsmr.messages) == ";:".join(commands)
+
+
+def test_batch_error_names_failing_command_without_resending(fsmr):
+    commands = [
+        "SWE:TIME 1S",
+        "CAL:PMET:ZERO:AUTO ONCE",
+        "*WAI",
+        "INP:ATT:REC:AUTO:STAT MAYBE",
+        "CORR:COLL PSPL",
+    ]
+    with pytest.raises(BatchError) as failure:
+        with batch(fsmr) as session:
+            for command in commands:
+                session.write_str(command)
+
+    assert failure.value.command == "INP:ATT:REC:AUTO:STAT MAYBE"
+    assert failure.value.position == 3
+    # The compound message is sent once; the calibration is not repeated
+    assert len(fsmr.messages) == 1
+
+
+def test_batch_error_without_context_reports_whole_message():
+    class TimingOut:
+        messages = []
+
+        def write_str(self, message):
+            self.messages.append(message)
+            raise TimeoutError("VISA timeout expired")
+
+    instrument = TimingOut()
+    with pytest.raises(BatchError) as failure:
+        with batch(instrument) as session:
+            session.write_str("SWE:TIME 1S")
+            session.write_str("CORR:COLL PSPL")
+
+    assert failure.value.command == "SWE:TIME 1S;:CORR:COLL PSPL"
+    assert failure.value.position is None
+    assert len(instrument.messages) == 1
+
+
+def test_action_headers_match_whole_nodes():
+    assert is_action("CAL:PMET:ZERO:AUTO")
+    assert is_action("CORR:COLL")
+    assert is_action("*WAI")
+    assert not is_action("CALC2:FEED")
+
+
+def test_state_cache_counts_sub_commands(fsmr):
+    session = StateCachingSession(fsmr, "FSMR")
+    session.write_str("FILT:HPAS ON;:FILT:LPAS ON")
+    session.write_str("FILT:HPAS ON;:FILT:LPAS ON;:FREQ:CENT 1 GHz")
+
+    assert fsmr.messages == ["FILT:HPAS ON;:FILT:LPAS ON", ":FREQ:CENT 1 GHz"]
+    assert (session.writes_sent, session.writes_saved) == (3, 2)
+
+
+def test_failed_binary_query_clears_the_state_cache():
+    class FailingBlockRead:
+        def write_str(self, message):
+            pass
+
+        def query_bin_block(self, query):
+            raise TimeoutError("VISA timeout expired")
+
+    session = StateCachingSession(FailingBlockRead())
+    session.write_str("FORM REAL,32")
+    with pytest.raises(TimeoutError):
+        session.query_bin_block("TRAC2:DATA? TRACE1")
+
+    assert session.settings == {}
@@ -0,0 +1,86 @@
+import numpy as np
+
+# Demodulated trace of screen B (the XTIM:AM:REL / XTIM:FM:REL feed)
+TRACE_QUERY = "TRAC2:DATA? TRACE1"
+
+# Sweep time of one capture: 20 periods of the 1 kHz modulation tone
+CAPTURE_TIME = 0.02
+
+
+def analyze_tone(traces, sample_rate, harmonics=5, span=3):
+    """Tone amplitude, frequency, THD and SINAD of demodulated traces
+
+    traces is one trace or a 2-D array with one trace per row; all rows are
+    analyzed in one vectorized pass. Returns a dict of arrays (scalars for
+    a single trace): "amplitude" (peak, in trace units, i.e. AM depth in %
+    or FM deviation in Hz), "frequency" (Hz), "thd" (%) and "sinad" (dB).
+    """
+    x = np.atleast_2d(np.asarray(traces, dtype=np.float64))
+    x = x - x.mean(axis=1, keepdims=True)
+    n = x.shape[1]
+    window = np.hanning(n)
+    power = np.abs(np.fft.rfft(x * window, axis=1)) ** 2
+    rows = np.arange(len(x))[:, None]
+    offsets = np.arange(-span, span + 1)
+
+    # Fundamental: strongest bin above DC, refined by its power centroid
+    peak = np.argmax(power[:, span + 1 :], axis=1) + span + 1
+    bins = np.clip(peak[:, None] + offsets, 0, power.shape[1] - 1)
+    tone_power = power[rows, bins].sum(axis=1)
+    centre = (power[rows, bins] * bins).sum(axis=1) / tone_power
+
+    harmonic_power = np.zeros(len(x))
+    for order in range(2, harmonics + 1):
+        harmonic = np.rint(centre * order).astype(int)[:, None] + offsets
+        inside = harmonic < power.shape[1]
+        harmonic_power += np.where(
+            inside, power[rows, np.minimum(harmonic, power.shape[1] - 1)], 0
+        ).sum(axis=1)
+
+    # Parseval: a sine of amplitude A holds (A / 2)^2 * n * sum(w^2) in its bins
+    total_power = power[:, span + 1 :].sum(axis=1)
+    noise_and_distortion = np.maximum(total_power - tone_power, 1e-30)
+    result = {
+        "amplitude": 2 * np.sqrt(tone_power / (n * np.sum(window**2))),
+        "frequency": centre * sample_rate / n,
+        "thd": 100 * np.sqrt(harmonic_power / tone_power),
+        "sinad": 10 * np.log10(total_power / noise_and_distortion),
+    }
+    if np.ndim(traces) == 1:
+        return {key: float(value[0]) for key, value in result.items()}
+    return result
+
+
+def analyze_segments(trace, sample_rate, segments, settle=0.0, **kwargs):
+    """Analyze one long capture as equal segments, e.g. one per mod depth step
+
+    The first settle fraction of every segment (the transient after the
+    step) is left out. Returns analyze_tone() arrays with one row per segment.
+    """
+    trace = np.asarray(trace)
+    length = len(trace) // segments
+    rows = trace[: length * segments].reshape(segments, length)
+    return analyze_tone(rows[:, int(length * settle) :], sample_rate, **kwargs)
+
+
+def synthetic_tone(
+    amplitude,
+    tone_frequency,
+    sample_rate,
+    points,
+    harmonics=(),
+    noise=0.0,
+    phase=0.0,
+):
+    """Demodulated test waveform: a tone plus harmonics (relative amplitudes) and noise
+
+    amplitude and noise may be arrays with one value per point, e.g. the
+    modulation stepping during a capture.
+    """
+    t = np.arange(points) / sample_rate
+    waveform = amplitude * np.cos(2 * np.pi * tone_frequency * t + phase)
+    for order, relative in enumerate(harmonics, start=2):
+        waveform += amplitude * relative * np.cos(2 * np.pi * order * tone_frequency * t)
+    if np.any(noise):
+        waveform += np.random.normal(0, noise, points)
+    return waveform
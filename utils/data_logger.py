@@ -1,50 +1,155 @@
 import csv
 from datetime import datetime
 import os
+from time import monotonic
 
 
 class DataLogger:
-    def __init__(self, base_directory="./logs"):
+    """CSV/text logger that keeps one open file per stream
+
+    Measurement rows are written in batches of batch_size; files are rotated
+    once they exceed max_bytes or are older than max_age seconds.
+    """
+
+    # Stream name -> (sub directory, file name prefix, extension)
+    STREAMS = {
+        "am": ("am_measurements", "AM_MOD", "csv"),
+        "fm": ("fm_measurements", "FM_MOD", "csv"),
+        "level": ("level_measurements", "LEVEL", "csv"),
+        "errors": ("errors", "errors", "txt"),
+    }
+
+    def __init__(
+        self, base_directory="./logs", batch_size=50, max_bytes=None, max_age=None
+    ):
         self.base_directory = base_directory
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._streams = {}
         self._create_directories()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def _create_directories(self):
         """Create directory structure for logs"""
-        directories = [
-            self.base_directory,
-            f"{self.base_directory}/am_measurements",
-            f"{self.base_directory}/level_measurements",
-            f"{self.base_directory}/errors",
+        directories = [self.base_directory] + [
+            f"{self.base_directory}/{directory}"
+            for directory, _, _ in self.STREAMS.values()
         ]
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
 
     def log_am_measurement(self, data):
         """Log AM measurement data"""
-        filename = f"{self.base_directory}/am_measurements/AM_MOD_{self.timestamp}.csv"
-        self._write_csv(filename, data)
+        self._stream("am").write_row(data)
+
+    def log_fm_measurement(self, data):
+        """Log FM measurement data"""
+        self._stream("fm").write_row(data)
 
     def log_level_measurement(self, data):
         """Log level measurement data"""
-        filename = (
-            f"{self.base_directory}/level_measurements/LEVEL_{self.timestamp}.csv"
-        )
-        self._write_csv(filename, data)
+        self._stream("level").write_row(data)
 
     def log_error(self, error_data):
         """Log error information"""
-        filename = f"{self.base_directory}/errors/errors_{self.timestamp}.txt"
-        with open(filename, "a") as f:
-            f.write(f"\n[{datetime.now()}] {error_data}\n")
-
-    def _write_csv(self, filename, data):
-        """Write data to CSV file"""
-        is_new_file = not os.path.exists(filename)
-        mode = "w" if is_new_file else "a"
-
-        with open(filename, mode, newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=data.keys())
-            if is_new_file:
-                writer.writeheader()
-            writer.writerow(data)
+        stream = self._stream("errors")
+        stream.write_text(f"\n[{datetime.now()}] {error_data}\n")
+        # Errors are rare and the most useful lines after a crash
+        stream.flush()
+
+    def flush(self):
+        """Write out buffered rows of every stream"""
+        for stream in self._streams.values():
+            stream.flush()
+
+    def close(self):
+        """Flush and close every open file"""
+        for stream in self._streams.values():
+            stream.close()
+        self._streams = {}
+
+    def _stream(self, name):
+        stream = self._streams.get(name)
+        if stream is None:
+            directory, prefix, extension = self.STREAMS[name]
+            stream = _LogStream(
+                f"{self.base_directory}/{directory}/{prefix}_{self.timestamp}",
+                extension,
+                self.batch_size if extension == "csv" else 1,
+                self.max_bytes,
+                self.max_age,
+            )
+            self._streams[name] = stream
+        return stream
+
+
+class _LogStream:
+    """One persistent, rotating log file"""
+
+    def __init__(self, base_path, extension, batch_size, max_bytes, max_age):
+        self.base_path = base_path
+        self.extension = extension
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.part = 0
+        self.fieldnames = None
+        self.file = None
+        self.writer = None
+        self.rows = []
+
+    def write_row(self, data):
+        if self.fieldnames is None:
+            self.fieldnames = list(data.keys())
+        self.rows.append(data)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def write_text(self, text):
+        self._open()
+        self.file.write(text)
+
+    def flush(self):
+        if self.rows:
+            self._open()
+            self.writer.writerows(self.rows)
+            self.rows = []
+        if self.file:
+            self.file.flush()
+            self._rotate_if_needed()
+
+    def close(self):
+        self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _open(self):
+        if self.file:
+            return
+        suffix = f"_{self.part}" if self.part else ""
+        self.file = open(
+            f"{self.base_path}{suffix}.{self.extension}", "a", newline=""
+        )
+        self.opened_at = monotonic()
+        if self.fieldnames is not None:
+            self.writer = csv.DictWriter(
+                self.file, fieldnames=self.fieldnames, extrasaction="ignore"
+            )
+            if self.file.tell() == 0:
+                self.writer.writeheader()
+
+    def _rotate_if_needed(self):
+        too_big = self.max_bytes and self.file.tell() >= self.max_bytes
+        too_old = self.max_age and monotonic() - self.opened_at >= self.max_age
+        if too_big or too_old:
+            self.file.close()
+            self.file = None
+            self.part += 1
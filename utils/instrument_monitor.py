@@ -1,53 +1,113 @@
-from datetime import datetime
 import threading
-from time import sleep
+
+from clock import get_clock
+from instrument_utils import read_error_queue
+
+# *STB? bit set while the error/event queue holds entries
+ERROR_QUEUE_BIT = 0x04
 
 
 class InstrumentMonitor:
-    def __init__(self, notification_manager):
+    # Real seconds between checks of the clock; a virtual clock may move
+    # ahead by any amount in between
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, notification_manager, interval=30, clock=None):
         self.notification_manager = notification_manager
-        self.monitoring = False
+        self.interval = interval
+        self.clock = clock or get_clock()
         self.monitor_thread = None
         self.instrument_status = {}
+        self._stop = threading.Event()
+
+    @property
+    def monitoring(self):
+        return self.monitor_thread is not None and not self._stop.is_set()
 
     def start_monitoring(self, FSMR_STD, SigGen_UUC):
-        """Start monitoring instruments"""
-        self.monitoring = True
+        """Start monitoring instruments
+
+        Pass the sessions the measurement loop uses. If they are
+        SharedSessions (scpi_session), a check only runs while the session
+        is idle, so it never splits a measurement transaction.
+        """
+        self._stop.clear()
         self.monitor_thread = threading.Thread(
-            target=self._monitor_loop, args=(FSMR_STD, SigGen_UUC)
+            target=self._monitor_loop,
+            args=({"FSMR": FSMR_STD, "SigGen": SigGen_UUC},),
+            daemon=True,
         )
         self.monitor_thread.start()
 
     def stop_monitoring(self):
         """Stop monitoring instruments"""
-        self.monitoring = False
+        self._stop.set()
         if self.monitor_thread:
             self.monitor_thread.join()
+            self.monitor_thread = None
 
-    def _monitor_loop(self, FSMR_STD, SigGen_UUC):
-        """Monitor instrument status periodically"""
-        while self.monitoring:
-            try:
-                # Check FSMR status
-                fsmr_status = FSMR_STD.query_str("SYST:ERR?")
-                if "No error" not in fsmr_status:
-                    self.notification_manager.log_warning(f"FSMR Error: {fsmr_status}")
-
-                # Check SigGen status
-                siggen_status = SigGen_UUC.query_str("SYST:ERR?")
-                if "No error" not in siggen_status:
-                    self.notification_manager.log_warning(
-                        f"SigGen Error: {siggen_status}"
-                    )
-
-                # Update status
-                self.instrument_status = {
-                    "timestamp": datetime.now(),
-                    "FSMR": fsmr_status,
-                    "SigGen": siggen_status,
-                }
+    def check_instruments(self, instruments):
+        """Read the status byte of each instrument and drain its error queue
 
+        Errors found are reported with log_warning. An instrument whose
+        session stays busy for POLL_INTERVAL is reported as "busy" and
+        checked again on the next pass. instrument_status keeps the latest
+        result of every instrument checked so far.
+        """
+        status = {"timestamp": self.clock.now()}
+        for name, session in instruments.items():
+            try:
+                errors = self._read_errors(session)
             except Exception as e:
-                self.notification_manager.log_error(f"Monitor error: {str(e)}")
+                self.notification_manager.log_error(
+                    f"Monitor error ({name}): {str(e)}"
+                )
+                status[name] = "unreachable"
+                continue
+            if errors is None:
+                status[name] = "busy"
+            elif errors:
+                self.notification_manager.log_warning(
+                    f"{name} error queue: {'; '.join(errors)}"
+                )
+                status[name] = errors
+            else:
+                status[name] = "No error"
+        self.instrument_status = {**self.instrument_status, **status}
+        return status
+
+    def _read_errors(self, session):
+        """Error queue entries, or None if the session stayed busy"""
+        lock = getattr(session, "lock", None)
+        if lock is not None and not lock.acquire(timeout=self.POLL_INTERVAL):
+            return None
+        try:
+            status_byte = int(float(session.query_str("*STB?")))
+            if not status_byte & ERROR_QUEUE_BIT:
+                return []
+            return read_error_queue(session)
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def _monitor_loop(self, instruments):
+        """Check each instrument every interval seconds of clock time
 
-            sleep(30)  # Check every 30 seconds
+        A busy instrument is retried on the next pass without checking the
+        others again before they are due.
+        """
+        next_check = dict.fromkeys(instruments, self.clock.monotonic())
+        while not self._stop.is_set():
+            now = self.clock.monotonic()
+            due = {
+                name: session
+                for name, session in instruments.items()
+                if now >= next_check[name]
+            }
+            if not due:
+                self._stop.wait(self.POLL_INTERVAL)
+                continue
+            status = self.check_instruments(due)
+            for name in due:
+                if status[name] != "busy":
+                    next_check[name] = self.clock.monotonic() + self.interval